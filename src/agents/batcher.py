@@ -0,0 +1,83 @@
+"""Micro-batching of query embeddings across concurrent requests."""
+from concurrent.futures import Future
+from typing import Callable, List
+import queue
+import threading
+import time
+
+from llama_index.core.base.embeddings.base import Embedding
+
+from src.config import QUERY_BATCH_SIZE, QUERY_BATCH_WAIT_MS
+
+
+class EmbeddingBatcher:
+    """Collect queries for a short window and embed them in one model call."""
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[Embedding]],
+        max_batch_size: int = QUERY_BATCH_SIZE,
+        max_wait_ms: float = QUERY_BATCH_WAIT_MS,
+    ):
+        """Batch calls to embed_batch, which maps a list of queries to embeddings."""
+        self._embed_batch = embed_batch
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, query: str) -> Future:
+        """Queue a query and return a future for its embedding."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((query, future))
+        return future
+
+    def embed(self, query: str) -> Embedding:
+        """Embed a query, sharing the model call with concurrent requests."""
+        return self.submit(query).result()
+
+    def _ensure_worker(self):
+        """Start the background worker on first use."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name="embedding-batcher",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def _collect(self):
+        """Block for one query, then gather more until the batch is full or the window closes."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._max_wait
+
+        while len(batch) < self._max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        """Embed batches of queued queries and resolve their futures."""
+        while True:
+            batch = self._collect()
+            queries = [query for query, _ in batch]
+
+            try:
+                embeddings = self._embed_batch(queries)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
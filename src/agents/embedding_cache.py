@@ -0,0 +1,137 @@
+"""Query embedding cache for the QA agent."""
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Optional
+import hashlib
+import inspect
+import threading
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+from src.config import COMMON_QUERIES_FILE, QUERY_EMBED_CACHE_SIZE
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that memoizes query embeddings in an LRU cache."""
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: OrderedDict = PrivateAttr()
+    _capacity: int = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, capacity: int = QUERY_EMBED_CACHE_SIZE):
+        """Wrap an embedding model with a query cache of the given capacity."""
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+        )
+        self._embed_model = embed_model
+        self._cache = OrderedDict()
+        self._capacity = capacity
+        self._lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        """Return the cache key for a query."""
+        return hashlib.sha1(text.encode("utf-8")).digest()
+
+    def _lookup(self, key: bytes) -> Optional[Embedding]:
+        """Return a cached embedding and mark it as recently used."""
+        with self._lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+            return embedding
+
+    def _store(self, key: bytes, embedding: Embedding):
+        """Add an embedding, evicting the least recently used entry if full."""
+        with self._lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            if len(self._cache) > self._capacity:
+                self._cache.popitem(last=False)
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        key = self._key(query)
+        embedding = self._lookup(key)
+        if embedding is None:
+            embedding = self._embed_model.get_query_embedding(query)
+            self._store(key, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        key = self._key(query)
+        embedding = self._lookup(key)
+        if embedding is None:
+            embedding = await self._embed_model.aget_query_embedding(query)
+            self._store(key, embedding)
+        return embedding
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed_model.get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self._embed_model.aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed_model.get_text_embedding_batch(texts)
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[Embedding]:
+        """Embed several queries, running the model once for all uncached ones."""
+        keys = [self._key(query) for query in queries]
+        embeddings = {key: self._lookup(key) for key in keys}
+
+        misses = {key: query for key, query in zip(keys, queries) if embeddings[key] is None}
+        if misses:
+            new_embeddings = _embed_queries(self._embed_model, list(misses.values()))
+            for key, embedding in zip(misses, new_embeddings):
+                self._store(key, embedding)
+                embeddings[key] = embedding
+
+        return [embeddings[key] for key in keys]
+
+    def warmup(self, queries: Iterable[str]):
+        """Pre-compute embeddings for queries that are expected to repeat."""
+        for query in queries:
+            self._get_query_embedding(query)
+
+
+@lru_cache(maxsize=None)
+def _has_query_prompt_embed(model_class: type) -> bool:
+    """Whether model_class is a HuggingFaceEmbedding whose _embed takes a prompt name."""
+    embed = getattr(model_class, "_embed", None)
+    return (
+        issubclass(model_class, HuggingFaceEmbedding)
+        and callable(embed)
+        and "prompt_name" in inspect.signature(embed).parameters
+    )
+
+
+def _embed_queries(embed_model: BaseEmbedding, queries: List[str]) -> List[Embedding]:
+    """Embed queries in a single forward pass where the model supports it."""
+    # e.g. InfinityEmbedding
+    if hasattr(embed_model, "get_query_embedding_batch"):
+        return embed_model.get_query_embedding_batch(queries)
+    # HuggingFaceEmbedding has no public batch query method. Its private _embed
+    # is what _get_query_embedding calls for one query, so use it with the
+    # whole list only while its signature still matches.
+    if _has_query_prompt_embed(embed_model.__class__):
+        return embed_model._embed(queries, prompt_name="query")
+    return [embed_model.get_query_embedding(query) for query in queries]
+
+
+def load_common_queries(path: Path = COMMON_QUERIES_FILE) -> List[str]:
+    """Load warmup queries, one per line, skipping blanks and # comments."""
+    if not path.exists():
+        return []
+
+    with open(path, encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
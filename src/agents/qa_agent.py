@@ -1,21 +1,19 @@
 """Q&A agent using LlamaIndex query engine."""
-from llama_index.core import VectorStoreIndex, Settings
+import mmap
+
+from llama_index.core import VectorStoreIndex, QueryBundle
 from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.llms.ollama import Ollama
 import chromadb
 
 from src.config import (
     CHROMA_DIR,
-    OLLAMA_BASE_URL,
-    OLLAMA_MODEL,
-    OLLAMA_REQUEST_TIMEOUT,
-    EMBEDDING_MODEL,
-    CHUNK_SIZE,
-    CHUNK_OVERLAP,
     SIMILARITY_TOP_K,
     CHROMA_COLLECTION_NAME,
+    HNSW_EF_SEARCH,
 )
+from src.agents.batcher import EmbeddingBatcher
+from src.agents.embedding_cache import CachedEmbedding, load_common_queries
+from src.embeddings.settings import create_embed_model, initialize_settings
 
 
 class QAAgent:
@@ -24,20 +22,16 @@ class QAAgent:
     def __init__(self):
         """Initialize the QA agent with vector store and query engine."""
         self._initialize_settings()
+        self.batcher = EmbeddingBatcher(self.embed_model.get_query_embedding_batch)
         self.index = self._load_index()
         self.query_engine = self._create_query_engine()
         self.chat_engine = self._create_chat_engine()
 
     def _initialize_settings(self):
         """Initialize global LlamaIndex settings."""
-        Settings.embed_model = HuggingFaceEmbedding(model_name=EMBEDDING_MODEL)
-        Settings.llm = Ollama(
-            model=OLLAMA_MODEL,
-            base_url=OLLAMA_BASE_URL,
-            request_timeout=OLLAMA_REQUEST_TIMEOUT,
-        )
-        Settings.chunk_size = CHUNK_SIZE
-        Settings.chunk_overlap = CHUNK_OVERLAP
+        self.embed_model = CachedEmbedding(create_embed_model())
+        self.embed_model.warmup(load_common_queries())
+        initialize_settings(self.embed_model)
 
     def _load_index(self):
         """Load the vector index from ChromaDB."""
@@ -53,6 +47,12 @@ class QAAgent:
                 f"Have you run the indexing script? Error: {e}"
             )
 
+        # Page the persisted HNSW graph in ahead of the first query
+        self._mmaps = self._preload_index_files()
+
+        # Apply the runtime search breadth without rebuilding the index
+        self._set_search_ef(chroma_collection, HNSW_EF_SEARCH)
+
         # Create vector store
         vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
 
@@ -61,6 +61,40 @@ class QAAgent:
 
         return index
 
+    @staticmethod
+    def _preload_index_files():
+        """Map Chroma's HNSW segment files and ask the kernel to read them ahead.
+
+        The mappings are returned so the caller can keep them alive.
+        """
+        mappings = []
+        for path in sorted([*CHROMA_DIR.rglob("*.bin"), *CHROMA_DIR.rglob("*.pickle")]):
+            try:
+                with open(path, "rb") as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                # Empty or unreadable files have nothing to preload
+                continue
+            if hasattr(mapping, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+                mapping.madvise(mmap.MADV_WILLNEED)
+            mappings.append(mapping)
+        return mappings
+
+    @staticmethod
+    def _set_search_ef(chroma_collection, ef_search: int):
+        """Set the HNSW ef_search parameter on a Chroma collection."""
+        try:
+            chroma_collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+        except Exception:
+            # Older Chroma releases only accept HNSW settings through metadata
+            try:
+                metadata = dict(chroma_collection.metadata or {})
+                metadata["hnsw:search_ef"] = ef_search
+                chroma_collection.modify(metadata=metadata)
+            except Exception:
+                # Keep the search_ef the collection was built with
+                pass
+
     def _create_query_engine(self):
         """Create a query engine for one-off questions."""
         return self.index.as_query_engine(
@@ -94,7 +128,10 @@ class QAAgent:
         Returns:
             The answer as a string
         """
-        response = self.query_engine.query(question)
+        # Concurrent questions share one embedding pass; retrieval and the
+        # LLM call stay per request
+        embedding = self.batcher.embed(question)
+        response = self.query_engine.query(QueryBundle(question, embedding=embedding))
         return str(response)
 
     def chat(self, message: str, chat_history=None):
@@ -114,6 +151,10 @@ class QAAgent:
         """Reset the chat history."""
         self.chat_engine.reset()
 
+    def warmup(self):
+        """Run a throwaway query so the index, embedding model and LLM are loaded."""
+        self.query_engine.query("warmup")
+
 
 # Global agent instance
 _agent_instance = None
@@ -1,10 +1,15 @@
 """Flask application factory and routes."""
-from flask import Flask, request, jsonify, Response, stream_with_context, render_template, send_from_directory
+from flask import Flask, g, request, jsonify, Response, stream_with_context, render_template, send_from_directory
 from flask_cors import CORS
+import hashlib
+import os
+import sqlite3
 import sys
-import json
+import time
 from pathlib import Path
 
+import orjson
+
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
@@ -13,44 +18,133 @@ from src.config import (
     FLASK_HOST,
     FLASK_PORT,
     FLASK_DEBUG,
+    ENABLE_WARMUP,
     PROJECT_ROOT,
     APP_TITLE,
     APP_SUBTITLE,
     DATA_DIR,
+    USE_X_SENDFILE,
+    PDF_CACHE_MAX_AGE,
 )
-from src.models import get_db
+from src.api.json_provider import OrjsonProvider
+from src.models import get_db, next_cursor
+
+
+# Absolute path prefix of indexed PDFs, used to build their URLs
+_DATA_PREFIX = str(DATA_DIR) + os.sep
+
+
+def _pdf_url(file_path: str, file_name: str) -> str:
+    """Return the URL a cited PDF is served from."""
+    if not file_path:
+        return ""
+    if file_path.startswith(_DATA_PREFIX):
+        rel_path = file_path.removeprefix(_DATA_PREFIX).replace(os.sep, "/")
+        return f"/static/pdfs/{rel_path}"
+    return f"/static/pdfs/{file_name}"
+
+
+# Streamed tokens are grouped into chunks of about this many characters, or
+# whatever arrived within the interval, to cut per-chunk framing overhead
+_STREAM_FLUSH_CHARS = 1024
+_STREAM_FLUSH_INTERVAL = 0.01  # seconds
+
+
+def _buffer_tokens(tokens, max_chars=_STREAM_FLUSH_CHARS, max_wait=_STREAM_FLUSH_INTERVAL):
+    """Group a token stream into larger chunks without delaying it noticeably."""
+    buffer = []
+    size = 0
+    last_flush = time.monotonic()
+
+    try:
+        for token in tokens:
+            buffer.append(token)
+            size += len(token)
+            now = time.monotonic()
+            if size >= max_chars or now - last_flush >= max_wait:
+                yield "".join(buffer)
+                buffer.clear()
+                size = 0
+                last_flush = now
+    except Exception:
+        # Send what was generated before the failure
+        if buffer:
+            yield "".join(buffer)
+        raise
+
+    if buffer:
+        yield "".join(buffer)
+
+
+def _render_static_page(template: str, **context):
+    """Render a page whose context never changes, returning its body and ETag."""
+    body = render_template(template, **context).encode("utf-8")
+    return body, hashlib.sha1(body).hexdigest()
+
+
+def _page_response(page):
+    """Serve a pre-rendered page, answering 304 when the client's copy is current."""
+    body, etag = page
+    response = Response(body, mimetype="text/html")
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 
-def create_app():
+def get_request_db():
+    """Get the conversation database for the current request.
+
+    Resolved once per app context and reused by every call in the request.
+    """
+    if "db" not in g:
+        g.db = get_db()
+    return g.db
+
+
+def create_app(testing: bool = False):
     """Create and configure the Flask application."""
     app = Flask(
         __name__,
         static_folder=str(PROJECT_ROOT / "static"),
         template_folder=str(PROJECT_ROOT / "templates"),
     )
+    app.config["TESTING"] = testing
+    app.config["STREAM_CHUNK_SIZE"] = _STREAM_FLUSH_CHARS
+    app.config["USE_X_SENDFILE"] = USE_X_SENDFILE
+    app.json = OrjsonProvider(app)
     CORS(app)
 
-    # Initialize agent on first request
-    agent = None
+    @app.teardown_appcontext
+    def release_db(exception=None):
+        """Drop the request's database handle."""
+        g.pop("db", None)
 
+    # Initialize agent on first request
     def get_or_create_agent():
-        nonlocal agent
+        agent = app.extensions.get("qa_agent")
         if agent is None:
             try:
-                agent = get_agent()
+                agent = app.extensions["qa_agent"] = get_agent()
             except RuntimeError as e:
                 return None, str(e)
         return agent, None
 
+    # Page context only comes from config, so render each page once
+    with app.app_context():
+        index_page = _render_static_page(
+            "index.html", app_title=APP_TITLE, app_subtitle=APP_SUBTITLE
+        )
+        history_page = _render_static_page("history.html", app_title=APP_TITLE)
+
     @app.route("/")
     def index():
         """Serve the main page."""
-        return render_template("index.html", app_title=APP_TITLE, app_subtitle=APP_SUBTITLE)
+        return _page_response(index_page)
 
     @app.route("/static/pdfs/<path:filename>")
     def serve_pdf(filename):
         """Serve PDF files from the data directory."""
-        return send_from_directory(DATA_DIR, filename)
+        # Conditional responses support ranges, so PDF viewers can seek without a full download
+        return send_from_directory(DATA_DIR, filename, conditional=True, max_age=PDF_CACHE_MAX_AGE)
 
     @app.route("/api/health", methods=["GET"])
     def health():
@@ -67,7 +161,7 @@ def create_app():
                 "question": "What is this document about?"
             }
         """
-        data = request.get_json()
+        data = request.get_json(force=True, silent=True)
 
         if not data or "question" not in data:
             return jsonify({"error": "Missing 'question' in request body"}), 400
@@ -95,7 +189,7 @@ def create_app():
                 "message": "Tell me more about..."
             }
         """
-        data = request.get_json()
+        data = request.get_json(force=True, silent=True)
 
         if not data or "message" not in data:
             return jsonify({"error": "Missing 'message' in request body"}), 400
@@ -112,61 +206,49 @@ def create_app():
             try:
                 response = agent_instance.chat(message)
 
-                # Stream the response first, collect full response text
-                full_response = ""
-                for token in response.response_gen:
-                    full_response += token
-                    yield token
+                # Stream the response first
+                yield from _buffer_tokens(
+                    response.response_gen, max_chars=app.config["STREAM_CHUNK_SIZE"]
+                )
 
                 # After streaming completes, build source mapping and append sources
                 source_map = {}
                 sources_list = []
                 seen_sources = set()
 
-                if hasattr(response, 'source_nodes') and response.source_nodes:
-                    for idx, node in enumerate(response.source_nodes, 1):
-                        # Extract file name and page number from metadata
-                        file_name = node.metadata.get('file_name', 'Unknown')
-                        page_label = node.metadata.get('page_label', '')
-                        file_path = node.metadata.get('file_path', '')
-
-                        # Create unique identifier for deduplication
-                        source_id = f"{file_name}_{page_label}"
-                        if source_id not in seen_sources:
-                            seen_sources.add(source_id)
-                            citation_num = len(sources_list) + 1
-
-                            # Get PDF URL
-                            pdf_url = ""
-                            if file_path:
-                                try:
-                                    rel_path = Path(file_path).relative_to(DATA_DIR)
-                                    pdf_url = f"/static/pdfs/{rel_path.as_posix()}"
-                                except ValueError:
-                                    pdf_url = f"/static/pdfs/{file_name}"
-
-                            # Store mapping for citations
-                            source_map[str(citation_num)] = {
-                                'url': pdf_url,
-                                'name': file_name,
-                                'page': page_label
-                            }
-
-                            # Format source entry for sources list
-                            if page_label:
-                                sources_list.append(f"[{file_name} (Page {page_label})]({pdf_url})")
-                            else:
-                                sources_list.append(f"[{file_name}]({pdf_url})")
-
-                # Send source mapping after response
-                if source_map:
-                    yield f"<sources>{json.dumps(source_map)}</sources>"
-
-                # Append source list
+                for node in getattr(response, "source_nodes", None) or []:
+                    # Extract file name and page number from metadata
+                    file_name = node.metadata.get('file_name', 'Unknown')
+                    page_label = node.metadata.get('page_label', '')
+
+                    # Deduplicate on file and page
+                    source_id = (file_name, page_label)
+                    if source_id in seen_sources:
+                        continue
+                    seen_sources.add(source_id)
+
+                    pdf_url = _pdf_url(node.metadata.get('file_path', ''), file_name)
+
+                    # Store mapping for citations
+                    source_map[str(len(sources_list) + 1)] = {
+                        'url': pdf_url,
+                        'name': file_name,
+                        'page': page_label
+                    }
+
+                    # Format source entry for sources list
+                    if page_label:
+                        sources_list.append(f"[{file_name} (Page {page_label})]({pdf_url})")
+                    else:
+                        sources_list.append(f"[{file_name}]({pdf_url})")
+
+                # Send source mapping and source list as a single chunk
                 if sources_list:
-                    yield "\n\n---\n\n**Sources:**\n\n"
-                    for i, source in enumerate(sources_list, 1):
-                        yield f"{i}. {source}\n"
+                    yield (
+                        f"<sources>{orjson.dumps(source_map).decode()}</sources>"
+                        "\n\n---\n\n**Sources:**\n\n"
+                        + "".join(f"{i}. {source}\n" for i, source in enumerate(sources_list, 1))
+                    )
             except Exception as e:
                 yield f"\n\nError: {str(e)}"
 
@@ -193,11 +275,33 @@ def create_app():
     def get_conversations():
         """Get list of conversations."""
         try:
-            db = get_db()
+            if "offset" in request.args:
+                # Offset paging was replaced by keyset cursors; don't silently return page 1
+                return jsonify({
+                    "error": "'offset' is no longer supported; pass the X-Next-Cursor header value as 'cursor'"
+                }), 400
+
+            db = get_request_db()
             limit = request.args.get("limit", 50, type=int)
-            offset = request.args.get("offset", 0, type=int)
-            conversations = db.list_conversations(limit=limit, offset=offset)
-            return jsonify(conversations)
+            if limit < 1:
+                # SQLite reads a negative LIMIT as no limit at all
+                return jsonify({"error": "'limit' must be at least 1"}), 400
+            cursor = request.args.get("cursor")
+            if cursor is not None:
+                try:
+                    updated_at, conversation_id = cursor.rsplit(",", 1)
+                    cursor = (updated_at, int(conversation_id))
+                except ValueError:
+                    return jsonify({"error": f"Invalid cursor: {cursor}"}), 400
+
+            conversations = db.list_conversations(limit=limit, cursor=cursor)
+            response = jsonify(conversations)
+
+            # The body stays a plain list; the next page's cursor rides in a header
+            following = next_cursor(conversations, limit)
+            if following is not None:
+                response.headers["X-Next-Cursor"] = f"{following[0]},{following[1]}"
+            return response
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
@@ -205,7 +309,7 @@ def create_app():
     def get_recent_conversations():
         """Get recent conversations for the flyout menu."""
         try:
-            db = get_db()
+            db = get_request_db()
             limit = request.args.get("limit", 10, type=int)
             conversations = db.get_recent_conversations(limit=limit)
             return jsonify(conversations)
@@ -220,9 +324,13 @@ def create_app():
             if not query:
                 return jsonify({"error": "Missing search query"}), 400
 
-            db = get_db()
+            db = get_request_db()
             limit = request.args.get("limit", 50, type=int)
-            conversations = db.search_conversations(query, limit=limit)
+            mode = request.args.get("mode", "contains")
+            if mode not in ("exact", "prefix", "contains"):
+                return jsonify({"error": f"Invalid search mode: {mode}"}), 400
+
+            conversations = db.search_conversations(query, limit=limit, mode=mode)
             return jsonify(conversations)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -231,10 +339,10 @@ def create_app():
     def create_conversation():
         """Create a new conversation."""
         try:
-            data = request.get_json() or {}
+            data = request.get_json(force=True, silent=True) or {}
             title = data.get("title", "New Conversation")
 
-            db = get_db()
+            db = get_request_db()
             conversation_id = db.create_conversation(title)
             return jsonify({"id": conversation_id, "title": title})
         except Exception as e:
@@ -244,7 +352,7 @@ def create_app():
     def get_conversation(conversation_id):
         """Get a specific conversation with all messages."""
         try:
-            db = get_db()
+            db = get_request_db()
             conversation = db.get_conversation(conversation_id)
             if not conversation:
                 return jsonify({"error": "Conversation not found"}), 404
@@ -256,11 +364,11 @@ def create_app():
     def update_conversation(conversation_id):
         """Update a conversation (e.g., change title)."""
         try:
-            data = request.get_json()
+            data = request.get_json(force=True, silent=True)
             if not data or "title" not in data:
                 return jsonify({"error": "Missing 'title' in request body"}), 400
 
-            db = get_db()
+            db = get_request_db()
             db.update_conversation_title(conversation_id, data["title"])
             return jsonify({"status": "Conversation updated"})
         except Exception as e:
@@ -270,7 +378,7 @@ def create_app():
     def delete_conversation(conversation_id):
         """Delete a conversation."""
         try:
-            db = get_db()
+            db = get_request_db()
             db.delete_conversation(conversation_id)
             return jsonify({"status": "Conversation deleted"})
         except Exception as e:
@@ -280,13 +388,17 @@ def create_app():
     def add_message(conversation_id):
         """Add a message to a conversation."""
         try:
-            data = request.get_json()
+            data = request.get_json(force=True, silent=True)
             if not data or "role" not in data or "content" not in data:
                 return jsonify({"error": "Missing 'role' or 'content' in request body"}), 400
 
-            db = get_db()
+            db = get_request_db()
             db.add_message(conversation_id, data["role"], data["content"])
             return jsonify({"status": "Message added"})
+        except TypeError as e:
+            return jsonify({"error": str(e)}), 400
+        except sqlite3.IntegrityError:
+            return jsonify({"error": "Conversation not found"}), 404
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
@@ -294,7 +406,7 @@ def create_app():
     def generate_conversation_title(conversation_id):
         """Generate a title for a conversation using AI."""
         try:
-            db = get_db()
+            db = get_request_db()
             conversation = db.get_conversation(conversation_id)
 
             if not conversation or not conversation.get("messages"):
@@ -322,14 +434,28 @@ def create_app():
     @app.route("/history")
     def conversation_history():
         """Serve the conversation history page."""
-        return render_template("history.html", app_title=APP_TITLE)
+        return _page_response(history_page)
 
     return app
 
 
+def warmup_agent():
+    """Create the QA agent and run a throwaway query before serving requests."""
+    print("Warming up QA agent...")
+    try:
+        get_agent().warmup()
+    except Exception as e:
+        print(f"Warning: QA agent warmup failed: {e}")
+
+
 def main():
     """Run the Flask application."""
     app = create_app()
+
+    # With the debug reloader, only the child process serves requests
+    if ENABLE_WARMUP and (not FLASK_DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
+        warmup_agent()
+
     print(f"\nStarting PDFChat server on http://{FLASK_HOST}:{FLASK_PORT}")
     print(f"Make sure Ollama is running with the '{app.config.get('OLLAMA_MODEL', 'nemotron')}' model")
     print("\nPress Ctrl+C to stop\n")
@@ -0,0 +1,51 @@
+"""orjson-backed JSON provider for Flask requests and responses."""
+from typing import Any
+import sqlite3
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+import orjson
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Serialize and parse JSON with orjson, keeping Flask's provider options."""
+
+    @staticmethod
+    def default(o: Any) -> Any:
+        """Serialize database rows as objects, deferring other types to Flask."""
+        if isinstance(o, sqlite3.Row):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
+    @staticmethod
+    def _option(sort_keys: bool, indent: bool) -> int:
+        """orjson option flags matching Flask's sort_keys and indent settings."""
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Serialize data as JSON to a string."""
+        option = self._option(kwargs.get("sort_keys", self.sort_keys), kwargs.get("indent"))
+        return orjson.dumps(obj, default=kwargs.get("default", self.default), option=option).decode()
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        """Serialize the arguments as JSON into a response, as jsonify does.
+
+        orjson's bytes become the body directly, skipping the str round trip
+        the base class makes through dumps().
+        """
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        option = self._option(self.sort_keys, indent) | orjson.OPT_APPEND_NEWLINE
+
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option), mimetype=self.mimetype
+        )
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        """Deserialize data as JSON from a string or bytes."""
+        return orjson.loads(s)
@@ -9,32 +9,94 @@ STORAGE_DIR = PROJECT_ROOT / "storage"
 CHROMA_DIR = STORAGE_DIR / "chroma_db"
 CACHE_DIR = STORAGE_DIR / "index_cache"
 DATABASE_DIR = STORAGE_DIR / "conversations"
+EMBED_MODEL_CACHE_DIR = CACHE_DIR / "embedding_models"
 
 # Ensure directories exist
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 STORAGE_DIR.mkdir(parents=True, exist_ok=True)
 CHROMA_DIR.mkdir(parents=True, exist_ok=True)
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
+DATABASE_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def _read_ollama_base_url() -> str:
+    """Ollama server URL from OLLAMA_BASE_URL."""
+    return os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
 
 # Ollama settings
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_BASE_URL = _read_ollama_base_url()
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "phi4-reasoning")
 OLLAMA_REQUEST_TIMEOUT = 120.0
 
 # Embedding settings
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
-EMBED_BATCH_SIZE = 10
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")  # "huggingface" or "infinity"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_SIZE_GPU = int(os.getenv("EMBED_BATCH_SIZE_GPU", "128"))
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", os.cpu_count() or 1))  # CPU inference threads
+
+# Query embedding cache settings
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1000"))
+COMMON_QUERIES_FILE = STORAGE_DIR / "common_queries.txt"
+
+# Concurrent /api/query requests arriving within the wait window share one
+# embedding forward pass
+QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "32"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "20"))
+
+# Chat messages are queued and written by a background thread, one
+# transaction per batch
+MESSAGE_WRITE_BATCH_SIZE = int(os.getenv("MESSAGE_WRITE_BATCH_SIZE", "500"))
+MESSAGE_WRITE_WAIT_MS = float(os.getenv("MESSAGE_WRITE_WAIT_MS", "10"))
 
 # LlamaIndex settings
 CHUNK_SIZE = 1024
 CHUNK_OVERLAP = 200
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "64"))  # PDF pages per indexing batch
 SIMILARITY_TOP_K = 5
 
+# HNSW index settings (ChromaDB collection)
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+
+
+def _read_hnsw_ef_search_mult() -> int:
+    """ef_search multiple of top-k from HNSW_EF_SEARCH_MULT."""
+    return int(os.getenv("HNSW_EF_SEARCH_MULT", "8"))
+
+
+def _read_hnsw_ef_search() -> int:
+    """ef_search from HNSW_EF_SEARCH, else scaled from SIMILARITY_TOP_K."""
+    return int(
+        os.getenv("HNSW_EF_SEARCH", max(40, SIMILARITY_TOP_K * _read_hnsw_ef_search_mult()))
+    )
+
+
+# ef_search is the candidate list size per query. It must be at least top-k,
+# and recall flattens out around a small multiple of k, so by default it
+# scales with SIMILARITY_TOP_K (floor of 40); set HNSW_EF_SEARCH to pin it.
+HNSW_EF_SEARCH_MULT = _read_hnsw_ef_search_mult()
+HNSW_EF_SEARCH = _read_hnsw_ef_search()
+
+
+def _read_flask_port() -> int:
+    """Server port from FLASK_PORT."""
+    return int(os.getenv("FLASK_PORT", "5000"))
+
+
 # Flask settings
 FLASK_HOST = os.getenv("FLASK_HOST", "127.0.0.1")
-FLASK_PORT = int(os.getenv("FLASK_PORT", "5000"))
+FLASK_PORT = _read_flask_port()
 FLASK_DEBUG = os.getenv("FLASK_DEBUG", "True").lower() == "true"
 
+# Let a fronting nginx/Apache send PDFs with X-Sendfile instead of streaming them from Python
+USE_X_SENDFILE = os.getenv("USE_X_SENDFILE", "False").lower() == "true"
+PDF_CACHE_MAX_AGE = int(os.getenv("PDF_CACHE_MAX_AGE", "86400"))  # seconds
+
+# Load the QA agent and models at startup instead of on the first request
+ENABLE_WARMUP = os.getenv("ENABLE_WARMUP", "True").lower() == "true"
+
 # ChromaDB collection name
 CHROMA_COLLECTION_NAME = "pdf_documents"
 
@@ -0,0 +1 @@
+"""Embedding backends for indexing and retrieval."""
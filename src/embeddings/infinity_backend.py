@@ -0,0 +1,102 @@
+"""LlamaIndex embedding backed by an in-process Infinity engine."""
+from typing import List, Optional
+import asyncio
+import threading
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.embeddings.huggingface.utils import format_query, format_text
+import torch
+
+
+class InfinityEmbedding(BaseEmbedding):
+    """Embedding model served by Infinity (dynamic batching, FP16, flash attention)."""
+
+    device: str = Field(description="Device the model runs on.")
+    dtype: str = Field(description="Model weight precision.")
+
+    _engine = PrivateAttr()
+    _loop: asyncio.AbstractEventLoop = PrivateAttr()
+
+    def __init__(
+        self,
+        model_name: str,
+        device: Optional[str] = None,
+        dtype: Optional[str] = None,
+        embed_batch_size: int = 32,
+    ):
+        """Start an Infinity engine for the model on a background event loop."""
+        try:
+            from infinity_emb import AsyncEmbeddingEngine, EngineArgs
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_BACKEND=infinity requires the 'infinity' extra: "
+                "uv sync --extra infinity"
+            ) from e
+
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        if dtype is None:
+            # Half precision only pays off on GPU; CPU kernels are fastest in FP32
+            dtype = "float16" if device == "cuda" else "float32"
+
+        super().__init__(
+            model_name=model_name,
+            embed_batch_size=embed_batch_size,
+            device=device,
+            dtype=dtype,
+        )
+
+        # The engine is bound to one event loop, so keep it alive on its own thread
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(
+            target=self._loop.run_forever,
+            name="infinity-embedding",
+            daemon=True,
+        ).start()
+
+        self._engine = AsyncEmbeddingEngine.from_args(
+            EngineArgs(
+                model_name_or_path=model_name,
+                engine="torch",
+                device=device,
+                dtype=dtype,
+                batch_size=embed_batch_size,
+            )
+        )
+        self._run(self._engine.astart())
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "InfinityEmbedding"
+
+    def _run(self, coro):
+        """Run a coroutine on the engine's event loop and wait for the result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _arun(self, coro):
+        """Await a coroutine running on the engine's event loop."""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    async def _embed(self, texts: List[str]) -> List[Embedding]:
+        embeddings, _usage = await self._engine.embed(sentences=texts)
+        return [embedding.tolist() for embedding in embeddings]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._run(self._embed([format_query(query, self.model_name)]))[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return (await self._arun(self._embed([format_query(query, self.model_name)])))[0]
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[Embedding]:
+        """Embed several queries in one engine call."""
+        return self._run(self._embed([format_query(query, self.model_name) for query in queries]))
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._arun(self._embed([format_text(text, self.model_name)])))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._run(self._embed([format_text(text, self.model_name) for text in texts]))
@@ -0,0 +1,75 @@
+"""Shared LlamaIndex settings for the indexer and the QA agent."""
+from llama_index.core import Settings
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from llama_index.llms.ollama import Ollama
+import torch
+
+from src.config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_MODEL,
+    OLLAMA_REQUEST_TIMEOUT,
+    EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
+    EMBED_BATCH_SIZE,
+    EMBED_BATCH_SIZE_GPU,
+    EMBED_MODEL_CACHE_DIR,
+    TORCH_NUM_THREADS,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+)
+from src.embeddings.infinity_backend import InfinityEmbedding
+
+
+def get_embedding_device() -> str:
+    """Return the torch device to run the embedding model on."""
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def configure_cpu_inference():
+    """Run CPU inference on all configured threads with oneDNN kernels."""
+    torch.set_num_threads(TORCH_NUM_THREADS)
+    torch.backends.mkldnn.enabled = True
+
+
+def create_embed_model() -> BaseEmbedding:
+    """Create the configured embedding model on the best available device."""
+    device = get_embedding_device()
+    batch_size = EMBED_BATCH_SIZE_GPU if device == "cuda" else EMBED_BATCH_SIZE
+    if device == "cpu":
+        configure_cpu_inference()
+
+    print(
+        f"Initializing {EMBEDDING_BACKEND} embedding model: {EMBEDDING_MODEL} "
+        f"({device}, batch size {batch_size})"
+    )
+    if EMBEDDING_BACKEND == "infinity":
+        return InfinityEmbedding(
+            model_name=EMBEDDING_MODEL,
+            embed_batch_size=batch_size,
+            device=device,
+        )
+
+    # Keep the weights in one project-local folder so the indexer and the
+    # server load the same safetensors files through the OS page cache
+    return HuggingFaceEmbedding(
+        model_name=EMBEDDING_MODEL,
+        embed_batch_size=batch_size,
+        device=device,
+        cache_folder=str(EMBED_MODEL_CACHE_DIR),
+    )
+
+
+def initialize_settings(embed_model: BaseEmbedding):
+    """Initialize global LlamaIndex settings around an embedding model."""
+    Settings.embed_model = embed_model
+
+    print(f"Initializing Ollama LLM: {OLLAMA_MODEL} at {OLLAMA_BASE_URL}")
+    Settings.llm = Ollama(
+        model=OLLAMA_MODEL,
+        base_url=OLLAMA_BASE_URL,
+        request_timeout=OLLAMA_REQUEST_TIMEOUT,
+    )
+
+    Settings.chunk_size = CHUNK_SIZE
+    Settings.chunk_overlap = CHUNK_OVERLAP
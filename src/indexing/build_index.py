@@ -1,76 +1,115 @@
 """Build and persist vector index from PDF documents."""
+import os
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from llama_index.core import (
+    Document,
     VectorStoreIndex,
-    SimpleDirectoryReader,
     StorageContext,
     Settings,
 )
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import MetadataMode
 from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.llms.ollama import Ollama
 import chromadb
+import fitz  # PyMuPDF
 
 from src.config import (
     DATA_DIR,
     CHROMA_DIR,
-    OLLAMA_BASE_URL,
-    OLLAMA_MODEL,
-    OLLAMA_REQUEST_TIMEOUT,
     EMBEDDING_MODEL,
     CHUNK_SIZE,
     CHUNK_OVERLAP,
+    INDEX_BATCH_SIZE,
     CHROMA_COLLECTION_NAME,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
 )
+from src.embeddings import settings
+from src.indexing.embedding_cache import EmbeddingCache
 
 
 def initialize_settings():
     """Initialize global LlamaIndex settings."""
-    print(f"Initializing embedding model: {EMBEDDING_MODEL}")
-    Settings.embed_model = HuggingFaceEmbedding(model_name=EMBEDDING_MODEL)
-
-    print(f"Initializing Ollama LLM: {OLLAMA_MODEL} at {OLLAMA_BASE_URL}")
-    Settings.llm = Ollama(
-        model=OLLAMA_MODEL,
-        base_url=OLLAMA_BASE_URL,
-        request_timeout=OLLAMA_REQUEST_TIMEOUT,
-    )
+    settings.initialize_settings(settings.create_embed_model())
+
+
+def _parse_one_pdf(path):
+    """Parse a single PDF into one Document per page.
+
+    Kept at module level so it can be pickled into worker processes.
+    """
+    documents = []
+    with fitz.open(path) as pdf:
+        for page_number, page in enumerate(pdf, 1):
+            documents.append(Document(
+                text=page.get_text(),
+                metadata={
+                    "file_name": path.name,
+                    "page_label": page.get_label() or str(page_number),
+                    "file_path": str(path),
+                },
+                # Match SimpleDirectoryReader: the path, not the name, gives chunk context
+                excluded_embed_metadata_keys=["file_name"],
+                excluded_llm_metadata_keys=["file_name"],
+            ))
+    return documents
+
+
+def iter_pdf_documents(pdf_files):
+    """Yield one Document per PDF page, parsing files in parallel across cores."""
+    pdf_files = list(pdf_files)
+    workers = min(os.cpu_count() or 1, len(pdf_files))
+
+    if workers <= 1:
+        for path in pdf_files:
+            yield from _parse_one_pdf(path)
+        return
 
-    Settings.chunk_size = CHUNK_SIZE
-    Settings.chunk_overlap = CHUNK_OVERLAP
+    # Parsing is CPU-bound pure Python. Only a window of files per worker is
+    # in flight, so parsed pages never pile up ahead of a slow indexer; each
+    # finished file frees a slot for the next, and results keep file order.
+    paths = iter(pdf_files)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque(
+            executor.submit(_parse_one_pdf, path) for path in islice(paths, 2 * workers)
+        )
+        while pending:
+            documents = pending.popleft().result()
+            for path in islice(paths, 1):
+                pending.append(executor.submit(_parse_one_pdf, path))
+            yield from documents
 
 
 def load_documents():
-    """Load PDF documents from data directory."""
+    """Load PDF documents from data directory.
+
+    Returns a lazy iterator of page Documents, or an empty list when there
+    is nothing to index.
+    """
     print(f"\nLoading PDFs from: {DATA_DIR}")
 
     if not DATA_DIR.exists():
         print(f"Error: Data directory does not exist: {DATA_DIR}")
         return []
 
-    pdf_files = list(DATA_DIR.rglob("*.pdf"))
+    pdf_files = sorted(DATA_DIR.rglob("*.pdf"))
     if not pdf_files:
         print(f"Warning: No PDF files found in {DATA_DIR}")
         return []
 
     print(f"Found {len(pdf_files)} PDF files")
 
-    # Load documents recursively
-    reader = SimpleDirectoryReader(
-        input_dir=str(DATA_DIR),
-        recursive=True,
-        required_exts=[".pdf"],
-    )
-
-    documents = reader.load_data()
-    print(f"Loaded {len(documents)} document chunks")
-
-    return documents
+    # Pages are parsed as the indexer consumes them
+    return iter_pdf_documents(pdf_files)
 
 
 def create_vector_store():
@@ -80,8 +119,16 @@ def create_vector_store():
     # Initialize ChromaDB client
     db = chromadb.PersistentClient(path=str(CHROMA_DIR))
 
-    # Get or create collection
-    chroma_collection = db.get_or_create_collection(CHROMA_COLLECTION_NAME)
+    # Get or create collection backed by an HNSW index
+    chroma_collection = db.get_or_create_collection(
+        CHROMA_COLLECTION_NAME,
+        metadata={
+            "hnsw:space": "cosine",
+            "hnsw:M": HNSW_M,
+            "hnsw:construction_ef": HNSW_EF_CONSTRUCTION,
+            "hnsw:search_ef": HNSW_EF_SEARCH,
+        },
+    )
 
     # Create vector store
     vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
@@ -89,20 +136,58 @@ def create_vector_store():
     return vector_store
 
 
-def build_index(documents, vector_store):
+def embed_nodes(nodes, cache):
+    """Attach embeddings to nodes, only running the model on uncached chunks."""
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    hashes = [cache.hash_text(text) for text in texts]
+
+    embeddings = cache.get_many(hashes)
+    uncached = {key: text for key, text in zip(hashes, texts) if key not in embeddings}
+    print(f"Found {len(nodes) - len(uncached)} cached embeddings, embedding {len(uncached)} chunks")
+
+    if uncached:
+        new_embeddings = Settings.embed_model.get_text_embedding_batch(
+            list(uncached.values()),
+            show_progress=True,
+        )
+        new_embeddings = dict(zip(uncached.keys(), new_embeddings))
+        cache.put_many(new_embeddings)
+        embeddings.update(new_embeddings)
+
+    for node, key in zip(nodes, hashes):
+        node.embedding = embeddings[key]
+
+
+def build_index(documents, vector_store, cache=None):
     """Build vector index from documents."""
     print("\nBuilding vector index...")
     print("This may take a while depending on the number of documents...")
 
+    splitter = SentenceSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+    # Reuse embeddings of chunks that were indexed before
+    if cache is None:
+        cache = EmbeddingCache(EMBEDDING_MODEL)
+
     # Create storage context
     storage_context = StorageContext.from_defaults(vector_store=vector_store)
 
     # Build index
-    index = VectorStoreIndex.from_documents(
-        documents,
-        storage_context=storage_context,
-        show_progress=True,
-    )
+    index = VectorStoreIndex([], storage_context=storage_context)
+
+    # Split, embed and insert a batch of pages at a time so parsing streams
+    # into embedding without holding every page in memory
+    documents = iter(documents)
+    total_pages = 0
+    total_chunks = 0
+    while batch := list(islice(documents, INDEX_BATCH_SIZE)):
+        nodes = splitter.get_nodes_from_documents(batch)
+        embed_nodes(nodes, cache)
+        index.insert_nodes(nodes)
+
+        total_pages += len(batch)
+        total_chunks += len(nodes)
+        print(f"Indexed {total_pages} pages ({total_chunks} chunks)")
 
     print("Index built successfully!")
     return index
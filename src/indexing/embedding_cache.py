@@ -0,0 +1,79 @@
+"""Persistent cache of chunk embeddings keyed by content hash and model."""
+from array import array
+from typing import Dict, Iterable, List
+import hashlib
+import sqlite3
+from pathlib import Path
+
+from src.config import CACHE_DIR
+
+
+EMBEDDING_CACHE_PATH = CACHE_DIR / "embeddings.db"
+
+# Stay well below SQLite's host-parameter limit in IN (...) lookups
+_LOOKUP_BATCH_SIZE = 500
+
+
+class EmbeddingCache:
+    """SQLite-backed store of embeddings for previously indexed chunks."""
+
+    def __init__(self, model_name: str, db_path: Path = EMBEDDING_CACHE_PATH):
+        """Initialize the cache for a given embedding model."""
+        self.model_name = model_name
+        self.db_path = db_path
+        self._init_db()
+
+    def _init_db(self):
+        """Initialize the cache table."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vec BLOB NOT NULL,
+                    PRIMARY KEY (hash, model)
+                ) WITHOUT ROWID
+            """)
+            conn.commit()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Return the cache key for a chunk of text."""
+        return hashlib.blake2b(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        """Look up cached embeddings, returning only the hashes that were found."""
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+
+        with sqlite3.connect(self.db_path) as conn:
+            for start in range(0, len(hashes), _LOOKUP_BATCH_SIZE):
+                batch = hashes[start:start + _LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                cursor = conn.execute(
+                    f"SELECT hash, vec FROM embedding_cache "
+                    f"WHERE model = ? AND hash IN ({placeholders})",
+                    (self.model_name, *batch)
+                )
+                for key, blob in cursor:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[key] = vec.tolist()
+
+        return found
+
+    def put_many(self, embeddings: Dict[str, List[float]]):
+        """Store embeddings keyed by chunk hash."""
+        rows = [
+            (key, self.model_name, len(vec), array("f", vec).tobytes())
+            for key, vec in embeddings.items()
+        ]
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (hash, model, dim, vec) "
+                "VALUES (?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
@@ -1,199 +1,635 @@
 """Database models for conversation history."""
-from datetime import datetime
-from typing import List, Optional
-import json
+from contextlib import contextmanager
+import atexit
+from datetime import datetime, timezone
+from typing import Iterable, List, Literal, Optional, Tuple
+import queue
 import sqlite3
+import threading
+import time
 from pathlib import Path
 
-from src.config import DATABASE_DIR
+import orjson
+
+from src.config import DATABASE_DIR, MESSAGE_WRITE_BATCH_SIZE, MESSAGE_WRITE_WAIT_MS
 
 
 DATABASE_PATH = DATABASE_DIR / "conversations.db"
 
+# Applied to every connection. WAL lets readers run alongside a writer and,
+# with synchronous=NORMAL, only fsyncs at checkpoints instead of every commit.
+CONNECTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -65536,  # 64 MiB
+    "mmap_size": 268435456,  # 256 MiB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # ms
+    "foreign_keys": "ON",
+}
+
+# Schema changes applied in order on top of the base tables. The number of
+# migrations already applied is tracked in PRAGMA user_version.
+MIGRATIONS = [
+    # 1: full-text index over message content, kept in sync by triggers
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content,
+        content='messages',
+        content_rowid='id',
+        tokenize='porter unicode61'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+    END;
+
+    INSERT INTO messages_fts (messages_fts) VALUES ('rebuild');
+    """,
+    # 2: fold diacritics when matching messages, and index titles as well
+    """
+    DROP TABLE IF EXISTS messages_fts;
+    CREATE VIRTUAL TABLE messages_fts USING fts5(
+        content,
+        content='messages',
+        content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    );
+    INSERT INTO messages_fts (messages_fts) VALUES ('rebuild');
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+        title,
+        content='conversations',
+        content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+        INSERT INTO conversations_fts (rowid, title) VALUES (new.id, new.title);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+        INSERT INTO conversations_fts (conversations_fts, rowid, title)
+        VALUES ('delete', old.id, old.title);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE OF title ON conversations BEGIN
+        INSERT INTO conversations_fts (conversations_fts, rowid, title)
+        VALUES ('delete', old.id, old.title);
+        INSERT INTO conversations_fts (rowid, title) VALUES (new.id, new.title);
+    END;
+
+    INSERT INTO conversations_fts (conversations_fts) VALUES ('rebuild');
+    """,
+    # 3: adding a message touches its conversation in the same statement
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_touch_conversation AFTER INSERT ON messages BEGIN
+        UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = new.conversation_id;
+    END;
+    """,
+    # 4: denormalized message count, maintained by the message triggers
+    """
+    ALTER TABLE conversations ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0;
+    UPDATE conversations
+    SET message_count = (SELECT COUNT(*) FROM messages WHERE conversation_id = conversations.id);
+
+    DROP TRIGGER IF EXISTS messages_touch_conversation;
+    CREATE TRIGGER messages_touch_conversation AFTER INSERT ON messages BEGIN
+        UPDATE conversations
+        SET updated_at = CURRENT_TIMESTAMP, message_count = message_count + 1
+        WHERE id = new.conversation_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS messages_count_delete AFTER DELETE ON messages BEGIN
+        UPDATE conversations SET message_count = message_count - 1
+        WHERE id = old.conversation_id;
+    END;
+    """,
+    # 5: store timestamps in their ISO-8601 wire format so reads need no formatting
+    """
+    UPDATE conversations
+    SET created_at = strftime('%Y-%m-%dT%H:%M:%fZ', created_at),
+        updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', updated_at);
+    UPDATE messages SET created_at = strftime('%Y-%m-%dT%H:%M:%fZ', created_at);
+
+    DROP TRIGGER IF EXISTS messages_touch_conversation;
+    CREATE TRIGGER messages_touch_conversation AFTER INSERT ON messages BEGIN
+        UPDATE conversations
+        SET updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now'), message_count = message_count + 1
+        WHERE id = new.conversation_id;
+    END;
+    """,
+    # 6: case-insensitive title index, range-seekable by LIKE 'prefix%'
+    """
+    CREATE INDEX IF NOT EXISTS idx_conversations_title ON conversations(title COLLATE NOCASE);
+    """,
+    # 7: break updated_at ties by id so listings can page by (updated_at, id) keyset
+    """
+    DROP INDEX IF EXISTS idx_conversations_updated;
+    CREATE INDEX idx_conversations_updated ON conversations(updated_at DESC, id DESC);
+    """,
+    # 8: a conversation's updated_at follows the timestamp its newest message was stamped with
+    """
+    DROP TRIGGER IF EXISTS messages_touch_conversation;
+    CREATE TRIGGER messages_touch_conversation AFTER INSERT ON messages BEGIN
+        UPDATE conversations
+        SET updated_at = MAX(updated_at, new.created_at), message_count = message_count + 1
+        WHERE id = new.conversation_id;
+    END;
+    """,
+]
+
+# Current time in the stored timestamp format, e.g. 2024-05-01T12:30:45.123Z.
+# Written explicitly because databases created before migration 5 keep their
+# CURRENT_TIMESTAMP column defaults.
+_NOW = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+
+_INSERT_MESSAGE = (
+    "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)"
+)
+
+
+def _utc_timestamp() -> str:
+    """Current time in the stored timestamp format."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _fts_phrase(query: str) -> str:
+    """Quote user input as an FTS5 phrase whose last word may be a prefix."""
+    return '"' + query.replace('"', '""') + '"*'
+
+
+def _like_prefix(query: str) -> str:
+    """Escape user input as a LIKE pattern matching strings that start with it."""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def _is_memory_database(db_path) -> bool:
+    """Whether db_path names an in-memory database, which starts empty on every open."""
+    key = str(db_path)
+    return key == ":memory:" or key.startswith("file::memory:") or "mode=memory" in key
+
 
 class ConversationDB:
     """Database manager for conversations."""
 
+    # Database files whose schema this process has already brought up to date
+    _initialized = set()
+    _initialized_lock = threading.Lock()
+
     def __init__(self, db_path: Path = DATABASE_PATH):
-        """Initialize database connection."""
+        """Open a long-lived connection to the database and initialize it."""
         self.db_path = db_path
-        self._init_db()
+        # Checked before connecting, which creates the file
+        is_new_file = not Path(str(db_path)).exists()
+        # One connection shared by all request threads, serialized by a lock.
+        # Autocommit mode, so multi-statement writes use _transaction().
+        self._conn = sqlite3.connect(
+            db_path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=256,
+            uri=isinstance(db_path, str) and db_path.startswith("file:"),
+        )
+        self._conn.row_factory = sqlite3.Row
+        for name, value in CONNECTION_PRAGMAS.items():
+            self._conn.execute(f"PRAGMA {name} = {value}")
+        self._lock = threading.RLock()
+        self._write_queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._closed = False
+
+        with self._initialized_lock:
+            key = str(db_path)
+            if key not in self._initialized or is_new_file:
+                self._init_db()
+                if not _is_memory_database(db_path):
+                    self._initialized.add(key)
+
+        atexit.register(self.close)
+
+    def close(self):
+        """Write any queued messages, refresh planner statistics and close the connection.
+
+        Calling it again is a no-op.
+        """
+        with self._writer_lock:
+            if self._closed:
+                return
+            self._closed = True
+            writer, self._writer = self._writer, None
+        atexit.unregister(self.close)
+        if writer is not None:
+            self._write_queue.put(None)
+            writer.join()
+        with self._lock:
+            # Re-analyzes only tables whose statistics have gone stale
+            self._conn.execute("PRAGMA optimize")
+            self._conn.close()
+
+    def flush(self):
+        """Block until every queued message has been written."""
+        self._write_queue.join()
+
+    def _ensure_writer(self):
+        """Start the background message writer on first use."""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._drain,
+                    name="conversation-writer",
+                    daemon=True,
+                )
+                self._writer.start()
+
+    def _collect_writes(self):
+        """Block for one queued message, then gather more until the batch is full or the window closes."""
+        batch = [self._write_queue.get()]
+        deadline = time.monotonic() + MESSAGE_WRITE_WAIT_MS / 1000
+
+        while batch[-1] is not None and len(batch) < MESSAGE_WRITE_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._write_queue.get(timeout=remaining))
+                else:
+                    batch.append(self._write_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _drain(self):
+        """Write queued messages in batches, one transaction per batch."""
+        while True:
+            batch = self._collect_writes()
+            rows = [row for row in batch if row is not None]
+
+            try:
+                self._write_messages(rows)
+            except Exception as e:
+                # Keep the writer alive, or flush() would wait on the queue forever
+                print(f"Warning: dropped {len(rows)} queued messages: {e}")
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+
+            if len(rows) < len(batch):
+                return
+
+    def _write_messages(self, rows: List[tuple]):
+        """Insert message rows, falling back to one at a time if the batch fails."""
+        if not rows:
+            return
+        try:
+            with self._transaction() as conn:
+                conn.executemany(_INSERT_MESSAGE, rows)
+        except sqlite3.Error:
+            # e.g. a message for a conversation deleted since it was queued
+            for row in rows:
+                try:
+                    self._conn_execute(_INSERT_MESSAGE, row)
+                except sqlite3.Error as e:
+                    print(f"Warning: dropped message for conversation {row[0]}: {e}")
+
+    @contextmanager
+    def _transaction(self):
+        """Run the enclosed statements atomically on the shared connection.
+
+        Inside an enclosing transaction the block becomes a savepoint, so a
+        failure only rolls back its own statements.
+        """
+        with self._lock:
+            if self._conn.in_transaction:
+                self._conn.execute("SAVEPOINT nested")
+                try:
+                    yield self._conn
+                except BaseException:
+                    self._conn.execute("ROLLBACK TO nested")
+                    self._conn.execute("RELEASE nested")
+                    raise
+                self._conn.execute("RELEASE nested")
+                return
+
+            # Take the write lock up front so WAL readers can't make the upgrade fail
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _conn_execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        """Run a single statement on the shared connection."""
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        """Run a single statement after any queued messages are written."""
+        self.flush()
+        return self._conn_execute(sql, params)
+
+    def _fetchall(self, sql: str, params=()) -> List[sqlite3.Row]:
+        """Run a query, once queued messages are written, and return its rows.
+
+        Rows support mapping-style access and are converted to objects by the
+        API's JSON provider, so no dict is built per row here.
+        """
+        self.flush()
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
 
     def _init_db(self):
         """Initialize database tables."""
-        with sqlite3.connect(self.db_path) as conn:
-            # Enable foreign key constraints
-            conn.execute("PRAGMA foreign_keys = ON")
-            cursor = conn.cursor()
-
-            # Conversations table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Messages table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    conversation_id INTEGER NOT NULL,
-                    role TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE
-                )
-            """)
-
-            # Index for faster searches
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_conversations_updated
-                ON conversations(updated_at DESC)
-            """)
-
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_messages_conversation
-                ON messages(conversation_id)
-            """)
-
-            conn.commit()
-
-    def create_conversation(self, title: str = "New Conversation") -> int:
-        """Create a new conversation."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO conversations (title) VALUES (?)",
-                (title,)
-            )
-            conn.commit()
-            return cursor.lastrowid
+        with self._lock:
+            with self._transaction() as conn:
+                # Conversations table
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS conversations (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        title TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+                        updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+                    )
+                """)
+
+                # Messages table
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS messages (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        conversation_id INTEGER NOT NULL,
+                        role TEXT NOT NULL,
+                        content TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+                        FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE
+                    )
+                """)
+
+                # Index for faster searches
+                conn.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_conversations_updated
+                    ON conversations(updated_at DESC, id DESC)
+                """)
+
+                conn.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_messages_conversation
+                    ON messages(conversation_id)
+                """)
+
+            self._migrate(self._conn)
+
+            # One-off planner statistics; close() keeps them current with PRAGMA optimize
+            has_stats = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            ).fetchone()
+            if not has_stats:
+                self._conn.execute("ANALYZE")
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        """Apply any schema migrations the database has not seen yet."""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, script in enumerate(MIGRATIONS[version:], version + 1):
+            conn.executescript(f"BEGIN; {script}; PRAGMA user_version = {number}; COMMIT;")
+
+    def create_conversation(self, title: str = "New Conversation", _now: Optional[str] = None) -> int:
+        """Create a new conversation.
+
+        _now overrides the creation timestamp, in the stored format, so tests
+        can order conversations without waiting on the clock.
+        """
+        # 'now' is fixed for the whole statement, so both columns get the same value
+        cursor = self._execute(
+            "INSERT INTO conversations (title, created_at, updated_at) "
+            f"VALUES (?1, COALESCE(?2, {_NOW}), COALESCE(?2, {_NOW}))",
+            (title, _now)
+        )
+        return cursor.lastrowid
+
+    def bulk_create_conversations(self, titles: Iterable[str]) -> List[int]:
+        """Create conversations in a single transaction, returning their IDs in order."""
+        self.flush()
+        with self._transaction() as conn:
+            return [
+                conn.execute(
+                    f"INSERT INTO conversations (title, created_at, updated_at) VALUES (?, {_NOW}, {_NOW})",
+                    (title,)
+                ).lastrowid
+                for title in titles
+            ]
 
     def update_conversation_title(self, conversation_id: int, title: str):
         """Update conversation title."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE conversations SET title = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                (title, conversation_id)
-            )
-            conn.commit()
-
-    def add_message(self, conversation_id: int, role: str, content: str):
-        """Add a message to a conversation."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
-                (conversation_id, role, content)
+        self._execute(
+            f"UPDATE conversations SET title = ?, updated_at = {_NOW} WHERE id = ?",
+            (title, conversation_id)
+        )
+
+    def add_message(self, conversation_id: int, role: str, content: str, _now: Optional[str] = None):
+        """Queue a message for the background writer.
+
+        The message is stamped now, or with _now if given, and written within
+        MESSAGE_WRITE_WAIT_MS, batched with any other queued messages. Reads
+        through this instance wait for queued writes first; call flush() to
+        wait explicitly. Raises TypeError if role or content is not a string,
+        and sqlite3.IntegrityError if the conversation does not exist.
+        """
+        # Fail now rather than in the writer, where an insert error could only
+        # be logged. The timestamp is updated by the messages_touch_conversation
+        # trigger.
+        if not isinstance(role, str) or not isinstance(content, str):
+            raise TypeError("Message role and content must be strings")
+        exists = self._conn_execute(
+            "SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        if exists is None:
+            raise sqlite3.IntegrityError(f"Conversation {conversation_id} does not exist")
+        self._ensure_writer()
+        self._write_queue.put((conversation_id, role, content, _now or _utc_timestamp()))
+
+    def add_messages(
+        self,
+        conversation_id: int,
+        messages: Iterable[Tuple[str, str]],
+        _now: Optional[str] = None,
+    ):
+        """Add (role, content) messages to a conversation in a single transaction.
+
+        _now overrides the messages' timestamp, as in add_message.
+        """
+        self.flush()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO messages (conversation_id, role, content, created_at) "
+                f"VALUES (?, ?, ?, COALESCE(?, {_NOW}))",
+                ((conversation_id, role, content, _now) for role, content in messages)
             )
-            # Update conversation timestamp
-            cursor.execute(
-                "UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                (conversation_id,)
-            )
-            conn.commit()
 
     def get_conversation(self, conversation_id: int) -> Optional[dict]:
         """Get a conversation with all its messages."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            # Get conversation
-            cursor.execute(
-                """
-                SELECT id, title,
-                       datetime(created_at) || 'Z' as created_at,
-                       datetime(updated_at) || 'Z' as updated_at
-                FROM conversations WHERE id = ?
-                """,
-                (conversation_id,)
-            )
-            conv_row = cursor.fetchone()
-
-            if not conv_row:
-                return None
-
-            # Get messages
-            cursor.execute(
+        # Messages are aggregated into a JSON array so one query returns everything
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
                 """
-                SELECT role, content,
-                       datetime(created_at) || 'Z' as created_at
-                FROM messages WHERE conversation_id = ? ORDER BY id ASC
+                SELECT c.id, c.title,
+                       c.created_at,
+                       c.updated_at,
+                       (
+                           SELECT json_group_array(
+                               json_object('role', role, 'content', content, 'created_at', created_at)
+                           )
+                           FROM (
+                               SELECT role, content, created_at
+                               FROM messages WHERE conversation_id = c.id ORDER BY id ASC
+                           )
+                       ) as messages
+                FROM conversations c WHERE c.id = ?
                 """,
                 (conversation_id,)
-            )
-            messages = [dict(row) for row in cursor.fetchall()]
-
-            return {
-                "id": conv_row["id"],
-                "title": conv_row["title"],
-                "created_at": conv_row["created_at"],
-                "updated_at": conv_row["updated_at"],
-                "messages": messages
-            }
-
-    def list_conversations(self, limit: int = 50, offset: int = 0) -> List[dict]:
-        """List conversations ordered by most recent."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            cursor.execute(
+            ).fetchone()
+
+        if not row:
+            return None
+
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "messages": orjson.loads(row["messages"])
+        }
+
+    def list_conversations(
+        self,
+        limit: int = 50,
+        cursor: Optional[Tuple[str, int]] = None,
+    ) -> List[sqlite3.Row]:
+        """List conversations ordered by most recent.
+
+        Pass the (updated_at, id) of the last row of a page as cursor to get
+        the next one; each page is a seek on idx_conversations_updated.
+        """
+        if cursor is None:
+            return self._fetchall(
                 """
                 SELECT c.id, c.title,
-                       datetime(c.created_at) || 'Z' as created_at,
-                       datetime(c.updated_at) || 'Z' as updated_at,
-                       (SELECT COUNT(*) FROM messages WHERE conversation_id = c.id) as message_count
+                       c.created_at,
+                       c.updated_at,
+                       c.message_count
                 FROM conversations c
-                ORDER BY c.updated_at DESC
-                LIMIT ? OFFSET ?
-                """,
-                (limit, offset)
-            )
-
-            return [dict(row) for row in cursor.fetchall()]
-
-    def search_conversations(self, query: str, limit: int = 50) -> List[dict]:
-        """Search conversations by title or message content."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            search_pattern = f"%{query}%"
-
-            cursor.execute(
-                """
-                SELECT DISTINCT c.id, c.title,
-                       datetime(c.created_at) || 'Z' as created_at,
-                       datetime(c.updated_at) || 'Z' as updated_at,
-                       (SELECT COUNT(*) FROM messages WHERE conversation_id = c.id) as message_count
-                FROM conversations c
-                LEFT JOIN messages m ON c.id = m.conversation_id
-                WHERE c.title LIKE ? OR m.content LIKE ?
-                ORDER BY c.updated_at DESC
+                ORDER BY c.updated_at DESC, c.id DESC
                 LIMIT ?
                 """,
-                (search_pattern, search_pattern, limit)
+                (limit,)
             )
 
-            return [dict(row) for row in cursor.fetchall()]
+        return self._fetchall(
+            """
+            SELECT c.id, c.title,
+                   c.created_at,
+                   c.updated_at,
+                   c.message_count
+            FROM conversations c
+            WHERE (c.updated_at, c.id) < (?, ?)
+            ORDER BY c.updated_at DESC, c.id DESC
+            LIMIT ?
+            """,
+            (*cursor, limit)
+        )
+
+    def search_conversations(
+        self,
+        query: str,
+        limit: int = 50,
+        mode: Literal["exact", "prefix", "contains"] = "contains",
+    ) -> List[sqlite3.Row]:
+        """Search conversations by title or message content.
+
+        In "contains" mode titles and messages are matched through their
+        full-text indexes and conversations are ranked by their best bm25
+        score, then recency. "exact" and "prefix" match whole titles only,
+        case-insensitively, as seeks on the title index, newest first.
+        """
+        if mode == "exact":
+            return self._search_titles("c.title = ? COLLATE NOCASE", query, limit)
+        if mode == "prefix":
+            return self._search_titles("c.title LIKE ? ESCAPE '\\'", _like_prefix(query), limit)
+        if mode != "contains":
+            raise ValueError(f"Unknown search mode: {mode!r}")
+
+        phrase = _fts_phrase(query)
+        return self._fetchall(
+            """
+            WITH matches AS (
+                -- rank is the bm25 score, lower is more relevant. Titles go
+                -- first: their branch needs no join back to messages.
+                SELECT rowid as id, rank FROM conversations_fts WHERE conversations_fts MATCH ?
+                UNION ALL
+                SELECT m.conversation_id, messages_fts.rank
+                FROM messages_fts
+                JOIN messages m ON m.id = messages_fts.rowid
+                WHERE messages_fts MATCH ?
+            ),
+            best AS (
+                SELECT id, MIN(rank) as rank FROM matches GROUP BY id
+            )
+            SELECT c.id, c.title,
+                   c.created_at,
+                   c.updated_at,
+                   c.message_count
+            FROM best
+            JOIN conversations c ON c.id = best.id
+            ORDER BY best.rank, c.updated_at DESC
+            LIMIT ?
+            """,
+            (phrase, phrase, limit)
+        )
+
+    def _search_titles(self, condition: str, value: str, limit: int) -> List[sqlite3.Row]:
+        """List conversations whose title satisfies condition, newest first."""
+        return self._fetchall(
+            f"""
+            SELECT c.id, c.title,
+                   c.created_at,
+                   c.updated_at,
+                   c.message_count
+            FROM conversations c
+            WHERE {condition}
+            ORDER BY c.updated_at DESC
+            LIMIT ?
+            """,
+            (value, limit)
+        )
 
     def delete_conversation(self, conversation_id: int):
         """Delete a conversation and all its messages."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA foreign_keys = ON")
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
-            conn.commit()
+        self._execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
 
-    def get_recent_conversations(self, limit: int = 10) -> List[dict]:
+    def get_recent_conversations(self, limit: int = 10) -> List[sqlite3.Row]:
         """Get the most recent conversations for the flyout menu."""
-        return self.list_conversations(limit=limit, offset=0)
+        return self.list_conversations(limit=limit)
+
+
+def next_cursor(rows: List[sqlite3.Row], limit: int) -> Optional[Tuple[str, int]]:
+    """Cursor for the page after rows, or None if rows was the last page."""
+    if not rows or len(rows) < limit:
+        return None
+    return rows[-1]["updated_at"], rows[-1]["id"]
 
 
 # Global database instance
@@ -3,9 +3,12 @@ import os
 import tempfile
 import pytest
 from pathlib import Path
-from unittest.mock import Mock, MagicMock
+from types import SimpleNamespace
+from unittest.mock import Mock
 import sqlite3
 
+import orjson
+
 # Add src to path for imports
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -14,6 +17,34 @@ from src.api.app import create_app
 from src.models import ConversationDB
 
 
+def jget(response):
+    """Parse a test response's JSON body with orjson."""
+    return orjson.loads(response.get_data())
+
+
+def pytest_addoption(parser):
+    """Register the --runslow opt-in for slow and integration tests."""
+    parser.addoption(
+        "--runslow",
+        action="store_true",
+        default=False,
+        help="run tests marked slow or integration",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip slow and integration tests unless --runslow or -m selects them."""
+    markexpr = config.getoption("-m") or ""
+    selected = "not" not in markexpr and ("slow" in markexpr or "integration" in markexpr)
+    if config.getoption("--runslow") or selected:
+        return
+
+    skip = pytest.mark.skip(reason="need --runslow or -m integration to run")
+    for item in items:
+        if "slow" in item.keywords or "integration" in item.keywords:
+            item.add_marker(skip)
+
+
 @pytest.fixture
 def temp_dir():
     """Create a temporary directory for tests."""
@@ -27,58 +58,99 @@ def test_db_path(temp_dir):
     return temp_dir / "test_conversations.db"
 
 
-@pytest.fixture
-def conversation_db(test_db_path):
-    """Create a test database instance."""
-    db = ConversationDB(db_path=test_db_path)
+# Shared in-memory database: the schema is created once per session and
+# lives as long as the session fixture's connection stays open
+MEMORY_DB_URI = "file::memory:?cache=shared"
+
+
+@pytest.fixture(scope="session")
+def session_db():
+    """Create the in-memory test database and its schema once per session."""
+    db = ConversationDB(db_path=MEMORY_DB_URI)
     yield db
-    # Cleanup is handled by temp_dir fixture
+    db.close()
 
 
 @pytest.fixture
-def app(monkeypatch, temp_dir):
-    """Create a Flask test application."""
-    # Set test environment variables
-    test_storage = temp_dir / "storage"
-    test_storage.mkdir(exist_ok=True)
+def db_tx(session_db):
+    """Run the test inside a savepoint that is rolled back afterwards."""
+    with session_db._lock:
+        session_db._conn.execute("SAVEPOINT test")
+    yield
+    session_db.flush()
+    with session_db._lock:
+        session_db._conn.execute("ROLLBACK TO test")
+        session_db._conn.execute("RELEASE test")
 
-    monkeypatch.setenv("FLASK_DEBUG", "False")
 
-    # Mock the agent to avoid needing Ollama running
-    mock_agent = Mock()
-    mock_agent.query.return_value = "Test response"
-    mock_agent.reset_chat.return_value = None
+@pytest.fixture
+def conversation_db(session_db, db_tx):
+    """Provide the session database, isolated per test by db_tx."""
+    return session_db
+
 
-    # Create mock streaming response
-    mock_stream_response = MagicMock()
-    mock_stream_response.response_gen = iter(["Test", " streaming", " response"])
-    mock_stream_response.source_nodes = []
-    mock_agent.chat.return_value = mock_stream_response
+@pytest.fixture
+def conversation(conversation_db):
+    """Insert a conversation titled "Test" directly and return its id."""
+    return conversation_db.create_conversation("Test")
 
-    # Patch get_agent to return our mock
-    def mock_get_agent():
-        return mock_agent
 
-    monkeypatch.setattr("src.api.app.get_agent", mock_get_agent)
+@pytest.fixture(scope="session")
+def app(session_db):
+    """Create the Flask test application once per session."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("FLASK_DEBUG", "False")
 
-    # Create test database for conversations
-    test_db = test_storage / "conversations" / "conversations.db"
-    test_db.parent.mkdir(parents=True, exist_ok=True)
+        # Patch get_db to use the shared test database, like the real singleton
+        mp.setattr("src.api.app.get_db", lambda: session_db)
 
-    # Patch get_db to use test database
-    def mock_get_db():
-        return ConversationDB(db_path=test_db)
+        app = create_app(testing=True)
+        # Tests read whole bodies; let each streamed response coalesce into one chunk
+        app.config["STREAM_CHUNK_SIZE"] = 65536
 
-    monkeypatch.setattr("src.api.app.get_db", mock_get_db)
+        yield app
 
-    app = create_app()
-    app.config["TESTING"] = True
 
-    yield app
+def _reset_mock_agent(agent):
+    """Give the shared agent its default canned responses."""
+    agent.reset_mock(return_value=True, side_effect=True)
+    agent.query.return_value = "Test response"
+    agent.reset_chat.return_value = None
+
+    # Plain streaming response; the endpoint only reads these two attributes
+    agent.chat.return_value = SimpleNamespace(
+        response_gen=iter(["Test", " streaming", " response"]),
+        source_nodes=[],
+    )
+
+
+# One mock agent for every test, so Ollama never needs to be running
+_SHARED_MOCK_AGENT = Mock()
+_reset_mock_agent(_SHARED_MOCK_AGENT)
+
+
+@pytest.fixture(autouse=True, scope="module")
+def stub_agent():
+    """Point the API's get_agent at the shared mock agent."""
+    import src.api.app as app_module
+
+    original = app_module.get_agent
+    app_module.get_agent = lambda: _SHARED_MOCK_AGENT
+    yield
+    app_module.get_agent = original
 
 
 @pytest.fixture
-def client(app):
+def mock_agent(app):
+    """Provide the shared mock agent; tests may reconfigure it directly."""
+    # The app caches its agent on first request; start each test without one
+    app.extensions.pop("qa_agent", None)
+    yield _SHARED_MOCK_AGENT
+    _reset_mock_agent(_SHARED_MOCK_AGENT)
+
+
+@pytest.fixture
+def client(app, mock_agent, db_tx):
     """Create a Flask test client."""
     return app.test_client()
 
@@ -86,18 +158,20 @@ def client(app):
 @pytest.fixture
 def mock_llm():
     """Create a mock LLM for testing."""
-    mock = Mock()
-    mock.complete.return_value = Mock(text="Test completion")
-    mock.chat.return_value = Mock(message=Mock(content="Test chat response"))
-    return mock
+    return SimpleNamespace(
+        complete=lambda prompt, **kwargs: SimpleNamespace(text="Test completion"),
+        chat=lambda messages, **kwargs: SimpleNamespace(
+            message=SimpleNamespace(content="Test chat response")
+        ),
+    )
 
 
 @pytest.fixture
 def mock_embed_model():
     """Create a mock embedding model for testing."""
-    mock = Mock()
-    mock.get_text_embedding.return_value = [0.1] * 384  # Standard embedding size
-    return mock
+    return SimpleNamespace(
+        get_text_embedding=lambda text: [0.1] * 384  # Standard embedding size
+    )
 
 
 @pytest.fixture
@@ -2,7 +2,11 @@
 import pytest
 from unittest.mock import Mock, MagicMock, patch
 
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+from src.agents.batcher import EmbeddingBatcher
 from src.agents.qa_agent import QAAgent, get_agent
+from src.agents.embedding_cache import CachedEmbedding, load_common_queries
 
 
 @pytest.mark.unit
@@ -11,7 +15,7 @@ class TestQAAgent:
 
     @patch("src.agents.qa_agent.chromadb.PersistentClient")
     @patch("src.agents.qa_agent.VectorStoreIndex")
-    @patch("src.agents.qa_agent.Settings")
+    @patch("src.embeddings.settings.Settings")
     def test_init_success(self, mock_settings, mock_index, mock_chromadb):
         """Test successful initialization of QAAgent."""
         # Setup mocks
@@ -33,7 +37,7 @@ class TestQAAgent:
         assert agent.chat_engine is not None
 
     @patch("src.agents.qa_agent.chromadb.PersistentClient")
-    @patch("src.agents.qa_agent.Settings")
+    @patch("src.embeddings.settings.Settings")
     def test_init_collection_not_found(self, mock_settings, mock_chromadb):
         """Test initialization when collection doesn't exist."""
         # Setup mock to raise exception
@@ -49,7 +53,7 @@ class TestQAAgent:
 
     @patch("src.agents.qa_agent.chromadb.PersistentClient")
     @patch("src.agents.qa_agent.VectorStoreIndex")
-    @patch("src.agents.qa_agent.Settings")
+    @patch("src.embeddings.settings.Settings")
     def test_query(self, mock_settings, mock_index, mock_chromadb):
         """Test query method."""
         # Setup mocks
@@ -72,11 +76,14 @@ class TestQAAgent:
         answer = agent.query("What is this?")
 
         assert answer == "Test answer"
-        mock_query_engine.query.assert_called_once_with("What is this?")
+        mock_query_engine.query.assert_called_once()
+        query_bundle = mock_query_engine.query.call_args[0][0]
+        assert query_bundle.query_str == "What is this?"
+        assert query_bundle.embedding is not None
 
     @patch("src.agents.qa_agent.chromadb.PersistentClient")
     @patch("src.agents.qa_agent.VectorStoreIndex")
-    @patch("src.agents.qa_agent.Settings")
+    @patch("src.embeddings.settings.Settings")
     def test_chat(self, mock_settings, mock_index, mock_chromadb):
         """Test chat method."""
         # Setup mocks
@@ -103,7 +110,7 @@ class TestQAAgent:
 
     @patch("src.agents.qa_agent.chromadb.PersistentClient")
     @patch("src.agents.qa_agent.VectorStoreIndex")
-    @patch("src.agents.qa_agent.Settings")
+    @patch("src.embeddings.settings.Settings")
     def test_reset_chat(self, mock_settings, mock_index, mock_chromadb):
         """Test reset_chat method."""
         # Setup mocks
@@ -125,7 +132,7 @@ class TestQAAgent:
 
     @patch("src.agents.qa_agent.chromadb.PersistentClient")
     @patch("src.agents.qa_agent.VectorStoreIndex")
-    @patch("src.agents.qa_agent.Settings")
+    @patch("src.embeddings.settings.Settings")
     def test_initialize_settings(self, mock_settings, mock_index, mock_chromadb):
         """Test that settings are initialized correctly."""
         # Setup mocks
@@ -148,7 +155,7 @@ class TestQAAgent:
 
     @patch("src.agents.qa_agent.chromadb.PersistentClient")
     @patch("src.agents.qa_agent.VectorStoreIndex")
-    @patch("src.agents.qa_agent.Settings")
+    @patch("src.embeddings.settings.Settings")
     def test_create_query_engine_with_config(self, mock_settings, mock_index, mock_chromadb):
         """Test that query engine is created with correct configuration."""
         # Setup mocks
@@ -171,7 +178,7 @@ class TestQAAgent:
 
     @patch("src.agents.qa_agent.chromadb.PersistentClient")
     @patch("src.agents.qa_agent.VectorStoreIndex")
-    @patch("src.agents.qa_agent.Settings")
+    @patch("src.embeddings.settings.Settings")
     def test_create_chat_engine_with_system_prompt(self, mock_settings, mock_index, mock_chromadb):
         """Test that chat engine is created with system prompt."""
         # Setup mocks
@@ -195,6 +202,92 @@ class TestQAAgent:
         assert "system_prompt" in call_kwargs
         assert len(call_kwargs["system_prompt"]) > 0
 
+    @patch("src.agents.qa_agent.chromadb.PersistentClient")
+    @patch("src.agents.qa_agent.VectorStoreIndex")
+    @patch("src.embeddings.settings.Settings")
+    def test_warmup(self, mock_settings, mock_index, mock_chromadb):
+        """Test that warmup runs a throwaway query."""
+        mock_db = Mock()
+        mock_db.get_collection.return_value = Mock()
+        mock_chromadb.return_value = mock_db
+
+        mock_vector_index = Mock()
+        mock_query_engine = Mock()
+        mock_vector_index.as_query_engine.return_value = mock_query_engine
+        mock_index.from_vector_store.return_value = mock_vector_index
+
+        agent = QAAgent()
+        agent.warmup()
+
+        mock_query_engine.query.assert_called_once()
+
+    @patch("src.embeddings.settings.EMBEDDING_BACKEND", "infinity")
+    @patch("src.agents.qa_agent.CachedEmbedding")
+    @patch("src.embeddings.settings.InfinityEmbedding")
+    @patch("src.agents.qa_agent.chromadb.PersistentClient")
+    @patch("src.agents.qa_agent.VectorStoreIndex")
+    @patch("src.embeddings.settings.Settings")
+    def test_infinity_backend(
+        self, mock_settings, mock_index, mock_chromadb, mock_infinity, mock_cached
+    ):
+        """Test that the Infinity backend is wrapped by the query cache."""
+        mock_chromadb.return_value = Mock()
+
+        QAAgent()
+
+        mock_infinity.assert_called_once()
+        mock_cached.assert_called_once_with(mock_infinity.return_value)
+        assert mock_settings.embed_model == mock_cached.return_value
+
+    def test_preload_index_files(self, temp_dir):
+        """Test that HNSW segment files are memory-mapped and empty files skipped."""
+        segment = temp_dir / "segment"
+        segment.mkdir()
+        (segment / "data_level0.bin").write_bytes(b"\x01" * 64)
+        (segment / "index_metadata.pickle").write_bytes(b"\x02" * 8)
+        (segment / "length.bin").write_bytes(b"")
+        (temp_dir / "chroma.sqlite3").write_bytes(b"\x03" * 8)
+
+        with patch("src.agents.qa_agent.CHROMA_DIR", temp_dir):
+            mappings = QAAgent._preload_index_files()
+
+        assert sorted(len(mapping) for mapping in mappings) == [8, 64]
+        for mapping in mappings:
+            mapping.close()
+
+    def test_set_search_ef(self):
+        """Test that ef_search is applied through the collection configuration."""
+        mock_collection = Mock()
+
+        QAAgent._set_search_ef(mock_collection, 50)
+
+        mock_collection.modify.assert_called_once_with(
+            configuration={"hnsw": {"ef_search": 50}}
+        )
+
+    def test_set_search_ef_metadata_fallback(self):
+        """Test fallback to metadata for older Chroma releases."""
+        mock_collection = Mock()
+        mock_collection.metadata = {"hnsw:space": "cosine"}
+        mock_collection.modify.side_effect = [TypeError("unexpected keyword"), None]
+
+        QAAgent._set_search_ef(mock_collection, 50)
+
+        assert mock_collection.modify.call_args[1]["metadata"] == {
+            "hnsw:space": "cosine",
+            "hnsw:search_ef": 50,
+        }
+
+    def test_set_search_ef_ignores_errors(self):
+        """Test that a collection rejecting modify is left as-is."""
+        mock_collection = Mock()
+        mock_collection.metadata = None
+        mock_collection.modify.side_effect = Exception("not supported")
+
+        QAAgent._set_search_ef(mock_collection, 50)
+
+        assert mock_collection.modify.call_count == 2
+
 
 @pytest.mark.unit
 class TestGetAgent:
@@ -202,7 +295,7 @@ class TestGetAgent:
 
     @patch("src.agents.qa_agent.chromadb.PersistentClient")
     @patch("src.agents.qa_agent.VectorStoreIndex")
-    @patch("src.agents.qa_agent.Settings")
+    @patch("src.embeddings.settings.Settings")
     def test_get_agent_singleton(self, mock_settings, mock_index, mock_chromadb):
         """Test that get_agent returns a singleton."""
         # Setup mocks
@@ -227,7 +320,7 @@ class TestGetAgent:
 
     @patch("src.agents.qa_agent.chromadb.PersistentClient")
     @patch("src.agents.qa_agent.VectorStoreIndex")
-    @patch("src.agents.qa_agent.Settings")
+    @patch("src.embeddings.settings.Settings")
     def test_get_agent_creates_new_instance(self, mock_settings, mock_index, mock_chromadb):
         """Test that get_agent creates a new instance if none exists."""
         # Setup mocks
@@ -250,6 +343,145 @@ class TestGetAgent:
         assert isinstance(agent, QAAgent)
 
 
+@pytest.mark.unit
+class TestCachedEmbedding:
+    """Test CachedEmbedding query cache."""
+
+    def _make_inner(self):
+        inner = Mock()
+        inner.model_name = "test-model"
+        inner.embed_batch_size = 10
+        inner.get_query_embedding.side_effect = lambda query: [float(len(query))]
+        return inner
+
+    def test_repeat_query_hits_cache(self):
+        """Test that a repeated query is only embedded once."""
+        inner = self._make_inner()
+        embed_model = CachedEmbedding(inner)
+
+        first = embed_model.get_query_embedding("What is this?")
+        second = embed_model.get_query_embedding("What is this?")
+
+        assert first == second == [13.0]
+        inner.get_query_embedding.assert_called_once_with("What is this?")
+
+    def test_lru_eviction(self):
+        """Test that the least recently used query is evicted at capacity."""
+        inner = self._make_inner()
+        embed_model = CachedEmbedding(inner, capacity=2)
+
+        embed_model.get_query_embedding("a")
+        embed_model.get_query_embedding("b")
+        embed_model.get_query_embedding("a")  # refresh "a"
+        embed_model.get_query_embedding("c")  # evicts "b"
+        embed_model.get_query_embedding("a")
+        embed_model.get_query_embedding("b")
+
+        calls = [call[0][0] for call in inner.get_query_embedding.call_args_list]
+        assert calls == ["a", "b", "c", "b"]
+
+    def test_text_embeddings_delegate(self):
+        """Test that document embeddings bypass the query cache."""
+        inner = self._make_inner()
+        inner.get_text_embedding_batch.return_value = [[1.0], [2.0]]
+        embed_model = CachedEmbedding(inner)
+
+        result = embed_model.get_text_embedding_batch(["x", "y"])
+
+        assert result == [[1.0], [2.0]]
+        inner.get_text_embedding_batch.assert_called_once_with(["x", "y"])
+
+    def test_warmup_prefills_cache(self):
+        """Test that warmed-up queries are served from the cache."""
+        inner = self._make_inner()
+        embed_model = CachedEmbedding(inner)
+
+        embed_model.warmup(["common question"])
+        embed_model.get_query_embedding("common question")
+
+        inner.get_query_embedding.assert_called_once_with("common question")
+
+    def test_query_embedding_batch(self):
+        """Test that a batch only embeds the queries missing from the cache."""
+        inner = self._make_inner()
+        inner.get_query_embedding_batch.side_effect = lambda queries: [[float(len(q))] for q in queries]
+        embed_model = CachedEmbedding(inner)
+        embed_model.get_query_embedding("cached")
+
+        result = embed_model.get_query_embedding_batch(["cached", "ab", "ab", "abc"])
+
+        assert result == [[6.0], [2.0], [2.0], [3.0]]
+        inner.get_query_embedding_batch.assert_called_once_with(["ab", "abc"])
+
+    def test_query_embedding_batch_huggingface(self):
+        """Test that HuggingFace models embed a batch of queries in one pass."""
+        inner = Mock(spec=HuggingFaceEmbedding)
+        inner.model_name = "test-model"
+        inner.embed_batch_size = 10
+        inner._embed.return_value = [[1.0], [2.0]]
+        embed_model = CachedEmbedding(inner)
+
+        assert embed_model.get_query_embedding_batch(["a", "b"]) == [[1.0], [2.0]]
+        inner._embed.assert_called_once_with(["a", "b"], prompt_name="query")
+
+    def test_query_embedding_batch_falls_back_to_public_api(self):
+        """Test that an unexpected private _embed signature falls back to get_query_embedding."""
+        class ChangedEmbedding(HuggingFaceEmbedding):
+            def _embed(self, inputs):
+                raise AssertionError("private _embed should not be called")
+
+        inner = Mock(spec=ChangedEmbedding)
+        inner.model_name = "test-model"
+        inner.embed_batch_size = 10
+        inner.get_query_embedding.side_effect = lambda query: [float(len(query))]
+        embed_model = CachedEmbedding(inner)
+
+        assert embed_model.get_query_embedding_batch(["a", "bb"]) == [[1.0], [2.0]]
+        inner._embed.assert_not_called()
+
+    def test_load_common_queries(self, temp_dir):
+        """Test loading warmup queries from a file."""
+        path = temp_dir / "common_queries.txt"
+        path.write_text("# comment\nWhat is this about?\n\n  Summarize the document  \n")
+
+        assert load_common_queries(path) == ["What is this about?", "Summarize the document"]
+
+    def test_load_common_queries_missing_file(self, temp_dir):
+        """Test that a missing warmup file yields no queries."""
+        assert load_common_queries(temp_dir / "missing.txt") == []
+
+
+@pytest.mark.unit
+class TestEmbeddingBatcher:
+    """Test EmbeddingBatcher micro-batching."""
+
+    def test_embed_single_query(self):
+        """Test that a lone query is embedded on its own."""
+        embed_batch = Mock(side_effect=lambda queries: [[float(len(q))] for q in queries])
+        batcher = EmbeddingBatcher(embed_batch, max_wait_ms=1)
+
+        assert batcher.embed("abc") == [3.0]
+        embed_batch.assert_called_once_with(["abc"])
+
+    def test_concurrent_queries_share_batch(self):
+        """Test that queries queued within the window are embedded together."""
+        embed_batch = Mock(side_effect=lambda queries: [[float(len(q))] for q in queries])
+        batcher = EmbeddingBatcher(embed_batch, max_batch_size=3, max_wait_ms=200)
+
+        futures = [batcher.submit(query) for query in ["a", "bb", "ccc", "dddd"]]
+
+        assert [future.result(timeout=5) for future in futures] == [[1.0], [2.0], [3.0], [4.0]]
+        batches = [call[0][0] for call in embed_batch.call_args_list]
+        assert batches == [["a", "bb", "ccc"], ["dddd"]]
+
+    def test_errors_propagate_to_callers(self):
+        """Test that a failed model call fails every query in the batch."""
+        batcher = EmbeddingBatcher(Mock(side_effect=RuntimeError("model down")), max_wait_ms=1)
+
+        with pytest.raises(RuntimeError, match="model down"):
+            batcher.embed("abc")
+
+
 @pytest.mark.slow
 @pytest.mark.integration
 class TestQAAgentIntegration:
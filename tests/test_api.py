@@ -1,9 +1,21 @@
 """Tests for Flask API endpoints."""
 import pytest
+import sqlite3
 import json
-from unittest.mock import Mock, MagicMock
+from types import SimpleNamespace
+from unittest.mock import Mock
 
+from src.api import app as app_module
 from src.api.app import create_app
+from src.api.json_provider import OrjsonProvider
+from tests.conftest import jget
+
+# Read-only source node shared by chat tests
+_SOURCE_NODE = SimpleNamespace(metadata={
+    "file_name": "test.pdf",
+    "page_label": "1",
+    "file_path": "/test/data/pdfs/test.pdf"
+})
 
 
 @pytest.mark.unit
@@ -15,7 +27,7 @@ class TestHealthEndpoint:
         response = client.get("/api/health")
         assert response.status_code == 200
 
-        data = response.get_json()
+        data = jget(response)
         assert data["status"] == "ok"
 
 
@@ -30,6 +42,95 @@ class TestIndexRoute:
         assert b"html" in response.data.lower()
 
 
+@pytest.mark.unit
+class TestStaticPages:
+    """Test pre-rendered HTML pages."""
+
+    @pytest.mark.parametrize("path", ["/", "/history"])
+    def test_page_not_rendered_per_request(self, app, client, monkeypatch, path):
+        """Test that pages are rendered once when the app is created."""
+        mock_render = Mock()
+        monkeypatch.setattr("src.api.app.render_template", mock_render)
+
+        response = client.get(path)
+
+        assert response.status_code == 200
+        assert response.mimetype == "text/html"
+        mock_render.assert_not_called()
+
+    @pytest.mark.parametrize("path", ["/", "/history"])
+    def test_page_conditional_get(self, client, path):
+        """Test that a matching If-None-Match gets a 304 without a body."""
+        first = client.get(path)
+        etag = first.headers["ETag"]
+
+        second = client.get(path, headers={"If-None-Match": etag})
+
+        assert second.status_code == 304
+        assert second.data == b""
+
+
+@pytest.mark.unit
+class TestServePdf:
+    """Test serving PDFs from the data directory."""
+
+    @pytest.fixture
+    def pdf_client(self, client, temp_dir, monkeypatch):
+        (temp_dir / "doc.pdf").write_bytes(b"%PDF-" + b"x" * 100)
+        monkeypatch.setattr("src.api.app.DATA_DIR", temp_dir)
+        return client
+
+    def test_serve_pdf_cache_headers(self, pdf_client):
+        """Test that PDFs are served with an ETag and long-lived caching."""
+        response = pdf_client.get("/static/pdfs/doc.pdf")
+
+        assert response.status_code == 200
+        assert response.headers["ETag"]
+        assert response.cache_control.max_age == 86400
+        response.close()
+
+    def test_serve_pdf_range_request(self, pdf_client):
+        """Test that PDF viewers can fetch partial ranges."""
+        response = pdf_client.get("/static/pdfs/doc.pdf", headers={"Range": "bytes=0-4"})
+
+        assert response.status_code == 206
+        assert response.data == b"%PDF-"
+        response.close()
+
+    def test_serve_pdf_not_modified(self, pdf_client):
+        """Test that a cached PDF is revalidated without resending it."""
+        first = pdf_client.get("/static/pdfs/doc.pdf")
+        first.close()
+
+        second = pdf_client.get(
+            "/static/pdfs/doc.pdf", headers={"If-None-Match": first.headers["ETag"]}
+        )
+
+        assert second.status_code == 304
+        second.close()
+
+    def test_serve_pdf_cache_max_age_setting(self, pdf_client, monkeypatch):
+        """Test that Cache-Control max-age follows PDF_CACHE_MAX_AGE."""
+        monkeypatch.setattr("src.api.app.PDF_CACHE_MAX_AGE", 60)
+
+        response = pdf_client.get("/static/pdfs/doc.pdf")
+
+        assert response.cache_control.max_age == 60
+        response.close()
+
+    def test_serve_pdf_x_sendfile(self, app, pdf_client, temp_dir, monkeypatch):
+        """Test that with USE_X_SENDFILE the front-end server is left to send the file."""
+        monkeypatch.setitem(app.config, "USE_X_SENDFILE", True)
+
+        response = pdf_client.get("/static/pdfs/doc.pdf")
+
+        assert response.status_code == 200
+        assert response.headers["X-Sendfile"] == str(temp_dir / "doc.pdf")
+        assert response.data == b""
+        assert response.cache_control.max_age == 86400
+        response.close()
+
+
 @pytest.mark.unit
 class TestQueryEndpoint:
     """Test /api/query endpoint."""
@@ -43,7 +144,7 @@ class TestQueryEndpoint:
         )
 
         assert response.status_code == 200
-        data = response.get_json()
+        data = jget(response)
         assert "answer" in data
         assert data["answer"] == "Test response"
 
@@ -56,23 +157,18 @@ class TestQueryEndpoint:
         )
 
         assert response.status_code == 400
-        data = response.get_json()
+        data = jget(response)
         assert "error" in data
 
     def test_query_no_json_body(self, client):
         """Test query without JSON body."""
         response = client.post("/api/query")
-        # Flask returns 415 for unsupported media type when no content-type
-        assert response.status_code in [400, 415]
+        # The body is parsed leniently, so a missing body is a plain bad request
+        assert response.status_code == 400
 
-    def test_query_with_agent_error(self, client, monkeypatch):
+    def test_query_with_agent_error(self, client, mock_agent):
         """Test query when agent raises an error."""
-        def mock_get_agent_error():
-            mock = Mock()
-            mock.query.side_effect = Exception("Test error")
-            return mock
-
-        monkeypatch.setattr("src.api.app.get_agent", mock_get_agent_error)
+        mock_agent.query.side_effect = Exception("Test error")
 
         response = client.post(
             "/api/query",
@@ -81,7 +177,7 @@ class TestQueryEndpoint:
         )
 
         assert response.status_code == 500
-        data = response.get_json()
+        data = jget(response)
         assert "error" in data
 
 
@@ -101,7 +197,7 @@ class TestChatEndpoint:
         assert response.content_type == "text/plain; charset=utf-8"
 
         # Get streaming response data
-        data = b"".join(response.response).decode("utf-8")
+        data = response.get_data(as_text=True)
         assert "Test streaming response" in data
 
     def test_chat_missing_message(self, client):
@@ -114,26 +210,13 @@ class TestChatEndpoint:
 
         assert response.status_code == 400
 
-    def test_chat_with_sources(self, client, monkeypatch):
+    def test_chat_with_sources(self, client, mock_agent):
         """Test chat with source nodes."""
-        # Create mock with source nodes
-        mock_agent = Mock()
-        mock_node = Mock()
-        mock_node.metadata = {
-            "file_name": "test.pdf",
-            "page_label": "1",
-            "file_path": "/test/data/pdfs/test.pdf"
-        }
-
-        mock_stream_response = MagicMock()
-        mock_stream_response.response_gen = iter(["Test response"])
-        mock_stream_response.source_nodes = [mock_node]
-        mock_agent.chat.return_value = mock_stream_response
-
-        def mock_get_agent():
-            return mock_agent
-
-        monkeypatch.setattr("src.api.app.get_agent", mock_get_agent)
+        # Only the token iterator is per-call; the source node is shared
+        mock_agent.chat.return_value = SimpleNamespace(
+            response_gen=iter(["Test response"]),
+            source_nodes=[_SOURCE_NODE],
+        )
 
         response = client.post(
             "/api/chat",
@@ -142,10 +225,101 @@ class TestChatEndpoint:
         )
 
         assert response.status_code == 200
-        data = b"".join(response.response).decode("utf-8")
+        data = response.get_data(as_text=True)
         assert "Sources:" in data
 
 
+@pytest.mark.unit
+class TestBufferTokens:
+    """Test grouping of streamed tokens into chunks."""
+
+    def test_groups_by_size(self):
+        """Test that tokens are flushed once the buffer reaches the size limit."""
+        chunks = list(app_module._buffer_tokens(iter(["ab", "cd", "ef", "g"]), max_chars=4, max_wait=60))
+
+        assert chunks == ["abcd", "efg"]
+
+    def test_flushes_after_interval(self, monkeypatch):
+        """Test that slow tokens are sent without waiting for a full buffer."""
+        clock = iter([0.0, 0.001, 0.05, 0.051])
+        monkeypatch.setattr(app_module.time, "monotonic", lambda: next(clock))
+
+        chunks = list(app_module._buffer_tokens(iter(["a", "b", "c"]), max_chars=1024, max_wait=0.01))
+
+        assert chunks == ["ab", "c"]
+
+    def test_flushes_before_error(self):
+        """Test that buffered text is sent before an error propagates."""
+        def failing_tokens():
+            yield "partial"
+            raise RuntimeError("LLM failed")
+
+        stream = app_module._buffer_tokens(failing_tokens(), max_chars=1024, max_wait=60)
+
+        assert next(stream) == "partial"
+        with pytest.raises(RuntimeError):
+            next(stream)
+
+
+@pytest.mark.unit
+class TestChatSources:
+    """Test the sources trailer appended to streamed chat responses."""
+
+    def _chat_with_nodes(self, client, mock_agent, metadatas):
+        mock_agent.chat.return_value = SimpleNamespace(
+            response_gen=iter(["Answer"]),
+            source_nodes=[SimpleNamespace(metadata=m) for m in metadatas],
+        )
+
+        response = client.post("/api/chat", json={"message": "Test"})
+        return [chunk.decode("utf-8") for chunk in response.response]
+
+    def test_sources_deduplicated_in_single_chunk(self, client, mock_agent):
+        """Test that duplicate pages are cited once and the trailer is one chunk."""
+        pdf_path = str(app_module.DATA_DIR / "manuals" / "guide.pdf")
+        chunks = self._chat_with_nodes(client, mock_agent, [
+            {"file_name": "guide.pdf", "page_label": "3", "file_path": pdf_path},
+            {"file_name": "guide.pdf", "page_label": "3", "file_path": pdf_path},
+            {"file_name": "guide.pdf", "page_label": "4", "file_path": pdf_path},
+        ])
+
+        assert chunks[0] == "Answer"
+        assert len(chunks) == 2
+        trailer = chunks[1]
+        sources = json.loads(trailer[len("<sources>"):trailer.index("</sources>")])
+        assert sources == {
+            "1": {"url": "/static/pdfs/manuals/guide.pdf", "name": "guide.pdf", "page": "3"},
+            "2": {"url": "/static/pdfs/manuals/guide.pdf", "name": "guide.pdf", "page": "4"},
+        }
+        assert "1. [guide.pdf (Page 3)](/static/pdfs/manuals/guide.pdf)\n" in trailer
+        assert "2. [guide.pdf (Page 4)](/static/pdfs/manuals/guide.pdf)\n" in trailer
+
+    def test_tokens_coalesced_to_chunk_size(self, app, client, mock_agent, monkeypatch):
+        """Test that streamed tokens are grouped up to STREAM_CHUNK_SIZE characters."""
+        monkeypatch.setitem(app.config, "STREAM_CHUNK_SIZE", 4)
+
+        mock_agent.chat.return_value = SimpleNamespace(
+            response_gen=iter(["ab", "cd", "ef", "g"]), source_nodes=[]
+        )
+        response = client.post("/api/chat", json={"message": "Test"})
+
+        assert [chunk.decode("utf-8") for chunk in response.response] == ["abcd", "efg"]
+
+    def test_no_sources(self, client, mock_agent):
+        """Test that no trailer is sent without source nodes."""
+        chunks = self._chat_with_nodes(client, mock_agent, [])
+
+        assert chunks == ["Answer"]
+
+    @pytest.mark.parametrize("file_path,expected", [
+        ("", ""),
+        ("/elsewhere/doc.pdf", "/static/pdfs/doc.pdf"),
+    ])
+    def test_pdf_url_outside_data_dir(self, file_path, expected):
+        """Test URLs for sources without a path under the data directory."""
+        assert app_module._pdf_url(file_path, "doc.pdf") == expected
+
+
 @pytest.mark.unit
 class TestResetEndpoint:
     """Test /api/reset endpoint."""
@@ -155,7 +329,7 @@ class TestResetEndpoint:
         response = client.post("/api/reset")
 
         assert response.status_code == 200
-        data = response.get_json()
+        data = jget(response)
         assert data["status"] == "Chat history reset"
 
 
@@ -172,7 +346,7 @@ class TestConversationEndpoints:
         )
 
         assert response.status_code == 200
-        data = response.get_json()
+        data = jget(response)
         assert "id" in data
         assert data["title"] == "Test Conversation"
 
@@ -185,7 +359,7 @@ class TestConversationEndpoints:
         )
 
         assert response.status_code == 200
-        data = response.get_json()
+        data = jget(response)
         assert data["title"] == "New Conversation"
 
     def test_get_conversations(self, client):
@@ -196,7 +370,7 @@ class TestConversationEndpoints:
         response = client.get("/api/conversations")
 
         assert response.status_code == 200
-        data = response.get_json()
+        data = jget(response)
         assert isinstance(data, list)
 
     def test_get_conversations_with_limit(self, client):
@@ -204,15 +378,51 @@ class TestConversationEndpoints:
         response = client.get("/api/conversations?limit=5")
 
         assert response.status_code == 200
-        data = response.get_json()
+        data = jget(response)
         assert len(data) <= 5
 
+    def test_get_conversations_pages_with_cursor(self, client):
+        """Test following X-Next-Cursor through every page."""
+        for i in range(5):
+            client.post("/api/conversations", json={"title": f"Conv {i}"})
+
+        titles = []
+        url = "/api/conversations?limit=2"
+        while url:
+            response = client.get(url)
+            assert response.status_code == 200
+            titles += [c["title"] for c in jget(response)]
+            cursor = response.headers.get("X-Next-Cursor")
+            url = f"/api/conversations?limit=2&cursor={cursor}" if cursor else None
+
+        assert sorted(titles) == [f"Conv {i}" for i in range(5)]
+
+    def test_get_conversations_invalid_cursor(self, client):
+        """Test that a malformed cursor is rejected."""
+        response = client.get("/api/conversations?cursor=nonsense")
+
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize("limit", [0, -1])
+    def test_get_conversations_non_positive_limit(self, client, limit):
+        """Test that a zero or negative page size is rejected."""
+        response = client.get(f"/api/conversations?limit={limit}")
+
+        assert response.status_code == 400
+
+    def test_get_conversations_offset_rejected(self, client):
+        """Test that the removed offset parameter is an error rather than page one."""
+        response = client.get("/api/conversations?offset=50")
+
+        assert response.status_code == 400
+        assert "cursor" in jget(response)["error"]
+
     def test_get_recent_conversations(self, client):
         """Test getting recent conversations."""
         response = client.get("/api/conversations/recent")
 
         assert response.status_code == 200
-        data = response.get_json()
+        data = jget(response)
         assert isinstance(data, list)
 
     def test_get_recent_conversations_with_limit(self, client):
@@ -220,7 +430,7 @@ class TestConversationEndpoints:
         response = client.get("/api/conversations/recent?limit=3")
 
         assert response.status_code == 200
-        data = response.get_json()
+        data = jget(response)
         assert len(data) <= 3
 
     def test_search_conversations(self, client):
@@ -231,31 +441,39 @@ class TestConversationEndpoints:
         response = client.get("/api/conversations/search?q=Python")
 
         assert response.status_code == 200
-        data = response.get_json()
+        data = jget(response)
         assert isinstance(data, list)
 
+    def test_search_conversations_prefix_mode(self, client):
+        """Test searching conversation titles by prefix."""
+        client.post("/api/conversations", json={"title": "Python Tutorial"})
+        client.post("/api/conversations", json={"title": "Learning Python"})
+
+        response = client.get("/api/conversations/search?q=python&mode=prefix")
+
+        assert response.status_code == 200
+        assert [c["title"] for c in jget(response)] == ["Python Tutorial"]
+
+    def test_search_conversations_invalid_mode(self, client):
+        """Test search with an unknown mode."""
+        response = client.get("/api/conversations/search?q=Python&mode=fuzzy")
+
+        assert response.status_code == 400
+
     def test_search_conversations_missing_query(self, client):
         """Test search without query parameter."""
         response = client.get("/api/conversations/search")
 
         assert response.status_code == 400
 
-    def test_get_conversation(self, client):
+    def test_get_conversation(self, client, conversation):
         """Test getting a specific conversation."""
-        # Create a conversation
-        create_response = client.post(
-            "/api/conversations",
-            json={"title": "Test"},
-            content_type="application/json"
-        )
-        conv_id = create_response.get_json()["id"]
-
         # Get the conversation
-        response = client.get(f"/api/conversations/{conv_id}")
+        response = client.get(f"/api/conversations/{conversation}")
 
         assert response.status_code == 200
-        data = response.get_json()
-        assert data["id"] == conv_id
+        data = jget(response)
+        assert data["id"] == conversation
         assert data["title"] == "Test"
 
     def test_get_nonexistent_conversation(self, client):
@@ -264,19 +482,11 @@ class TestConversationEndpoints:
 
         assert response.status_code == 404
 
-    def test_update_conversation(self, client):
+    def test_update_conversation(self, client, conversation_db, conversation):
         """Test updating a conversation."""
-        # Create a conversation
-        create_response = client.post(
-            "/api/conversations",
-            json={"title": "Original"},
-            content_type="application/json"
-        )
-        conv_id = create_response.get_json()["id"]
-
         # Update it
         response = client.put(
-            f"/api/conversations/{conv_id}",
+            f"/api/conversations/{conversation}",
             json={"title": "Updated"},
             content_type="application/json"
         )
@@ -284,8 +494,7 @@ class TestConversationEndpoints:
         assert response.status_code == 200
 
         # Verify the update
-        get_response = client.get(f"/api/conversations/{conv_id}")
-        assert get_response.get_json()["title"] == "Updated"
+        assert conversation_db.get_conversation(conversation)["title"] == "Updated"
 
     def test_update_conversation_missing_title(self, client):
         """Test updating conversation without title."""
@@ -297,38 +506,21 @@ class TestConversationEndpoints:
 
         assert response.status_code == 400
 
-    def test_delete_conversation(self, client):
+    def test_delete_conversation(self, client, conversation_db, conversation):
         """Test deleting a conversation."""
-        # Create a conversation
-        create_response = client.post(
-            "/api/conversations",
-            json={"title": "To Delete"},
-            content_type="application/json"
-        )
-        conv_id = create_response.get_json()["id"]
-
         # Delete it
-        response = client.delete(f"/api/conversations/{conv_id}")
+        response = client.delete(f"/api/conversations/{conversation}")
 
         assert response.status_code == 200
 
         # Verify it's deleted
-        get_response = client.get(f"/api/conversations/{conv_id}")
-        assert get_response.status_code == 404
+        assert conversation_db.get_conversation(conversation) is None
 
-    def test_add_message(self, client):
+    def test_add_message(self, client, conversation_db, conversation):
         """Test adding a message to a conversation."""
-        # Create a conversation
-        create_response = client.post(
-            "/api/conversations",
-            json={"title": "Test"},
-            content_type="application/json"
-        )
-        conv_id = create_response.get_json()["id"]
-
         # Add a message
         response = client.post(
-            f"/api/conversations/{conv_id}/messages",
+            f"/api/conversations/{conversation}/messages",
             json={"role": "user", "content": "Hello"},
             content_type="application/json"
         )
@@ -336,8 +528,7 @@ class TestConversationEndpoints:
         assert response.status_code == 200
 
         # Verify the message was added
-        get_response = client.get(f"/api/conversations/{conv_id}")
-        messages = get_response.get_json()["messages"]
+        messages = conversation_db.get_conversation(conversation)["messages"]
         assert len(messages) == 1
         assert messages[0]["role"] == "user"
         assert messages[0]["content"] == "Hello"
@@ -352,41 +543,49 @@ class TestConversationEndpoints:
 
         assert response.status_code == 400
 
-    def test_generate_conversation_title(self, client):
-        """Test generating a title for a conversation."""
-        # Create a conversation with a message
-        create_response = client.post(
-            "/api/conversations",
-            json={"title": "New Conversation"},
+    @pytest.mark.parametrize("body", [
+        {"role": "user", "content": None},
+        {"role": None, "content": "Hello"},
+        {"role": "user", "content": {"a": 1}},
+        {"role": "user", "content": ["x"]},
+    ])
+    def test_add_message_non_string_fields(self, client, conversation_db, conversation, body):
+        """Test that null or non-string role/content is rejected rather than dropped later."""
+        response = client.post(
+            f"/api/conversations/{conversation}/messages",
+            json=body,
             content_type="application/json"
         )
-        conv_id = create_response.get_json()["id"]
 
-        # Add a user message
-        client.post(
-            f"/api/conversations/{conv_id}/messages",
-            json={"role": "user", "content": "Tell me about Python programming"},
+        assert response.status_code == 400
+        assert conversation_db.get_conversation(conversation)["messages"] == []
+
+    def test_add_message_nonexistent_conversation(self, client):
+        """Test adding a message to a conversation that doesn't exist."""
+        response = client.post(
+            "/api/conversations/99999/messages",
+            json={"role": "user", "content": "Hello"},
             content_type="application/json"
         )
 
+        assert response.status_code == 404
+
+    def test_generate_conversation_title(self, client, conversation_db, conversation):
+        """Test generating a title for a conversation."""
+        # Add a user message
+        conversation_db.add_message(conversation, "user", "Tell me about Python programming")
+
         # Generate title
-        response = client.post(f"/api/conversations/{conv_id}/title")
+        response = client.post(f"/api/conversations/{conversation}/title")
 
         assert response.status_code == 200
-        data = response.get_json()
+        data = jget(response)
         assert "title" in data
         assert len(data["title"]) > 0
 
-    def test_generate_title_no_messages(self, client):
+    def test_generate_title_no_messages(self, client, conversation):
         """Test generating title for conversation with no messages."""
-        create_response = client.post(
-            "/api/conversations",
-            json={"title": "Empty"},
-            content_type="application/json"
-        )
-        conv_id = create_response.get_json()["id"]
-
-        response = client.post(f"/api/conversations/{conv_id}/title")
+        response = client.post(f"/api/conversations/{conversation}/title")
 
         assert response.status_code == 404
 
@@ -397,6 +596,126 @@ class TestConversationEndpoints:
         assert response.status_code == 404
 
 
+@pytest.mark.unit
+class TestJsonProvider:
+    """Test the orjson-backed JSON provider."""
+
+    def test_app_uses_orjson_provider(self, app):
+        """Test that the app serializes responses with orjson."""
+        assert isinstance(app.json, OrjsonProvider)
+
+    def test_dumps_matches_stdlib(self, app):
+        """Test that output decodes to the same data as the stdlib encoder."""
+        data = {"b": [1, 2.5, None, True], "a": "caf\u00e9 \"quoted\"", "c": {"1": "x"}}
+
+        assert json.loads(app.json.dumps(data)) == data
+
+    def test_dumps_sort_keys_and_indent(self, app):
+        """Test that Flask's sort_keys and indent options are honoured."""
+        assert app.json.dumps({"b": 1, "a": 2}) == '{"a":2,"b":1}'
+        assert app.json.dumps({"a": 1}, indent=2) == '{\n  "a": 1\n}'
+
+    def test_dumps_uses_default(self, app):
+        """Test that unsupported types fall back to the provider default."""
+        assert app.json.dumps({"ids": {1}}, default=sorted) == '{"ids":[1]}'
+
+        with pytest.raises(TypeError):
+            app.json.dumps({"value": object()})
+
+    def test_dumps_database_rows(self, app):
+        """Test that sqlite3.Row results serialize as objects."""
+        conn = sqlite3.connect(":memory:")
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT 1 as id, 'Chat' as title").fetchall()
+
+        assert app.json.dumps(rows) == '[{"id":1,"title":"Chat"}]'
+
+    def test_response_body(self, app):
+        """Test that jsonify writes orjson bytes with a trailing newline."""
+        with app.app_context():
+            response = app.json.response({"b": [1, 2], "a": "caf\u00e9"})
+
+        assert response.mimetype == "application/json"
+        assert response.data == '{"a":"caf\u00e9","b":[1,2]}\n'.encode()
+
+    def test_response_indents_when_not_compact(self, app, monkeypatch):
+        """Test that non-compact responses are pretty-printed like Flask's."""
+        monkeypatch.setattr(app.json, "compact", False)
+
+        with app.app_context():
+            response = app.json.response(a=1)
+
+        assert response.data == b'{\n  "a": 1\n}\n'
+
+    def test_loads(self, app):
+        """Test that request bodies are parsed from bytes or str."""
+        assert app.json.loads(b'{"message": "caf\\u00e9"}') == {"message": "caf\u00e9"}
+        assert app.json.loads("[1, 2]") == [1, 2]
+
+        with pytest.raises(ValueError):
+            app.json.loads(b"{not json")
+
+    def test_invalid_json_body(self, client):
+        """Test that a malformed body is reported as a missing field."""
+        response = client.post("/api/chat", data=b"{not json", content_type="application/json")
+
+        assert response.status_code == 400
+        assert "Missing 'message'" in jget(response)["error"]
+
+    def test_json_body_without_content_type(self, client):
+        """Test that JSON bodies are parsed regardless of the content type."""
+        response = client.post("/api/conversations", data=b'{"title": "Plain"}')
+
+        assert response.status_code == 200
+        assert jget(response)["title"] == "Plain"
+
+    def test_jsonify_response(self, client):
+        """Test that endpoints still return JSON responses."""
+        response = client.get("/api/health")
+
+        assert response.mimetype == "application/json"
+        assert jget(response) == {"status": "ok"}
+
+
+@pytest.mark.unit
+class TestCreateApp:
+    """Test the application factory."""
+
+    def test_testing_flag(self, app):
+        """Test that the testing flag sets Flask's TESTING config."""
+        assert app.testing is True
+        assert create_app().testing is False
+
+
+@pytest.mark.unit
+class TestRequestDatabase:
+    """Test per-request database access."""
+
+    def test_db_resolved_once_per_request(self, app, monkeypatch):
+        """Test that repeated lookups in one request reuse the same database."""
+        mock_get_db = Mock()
+        monkeypatch.setattr("src.api.app.get_db", mock_get_db)
+
+        with app.app_context():
+            first = app_module.get_request_db()
+            second = app_module.get_request_db()
+
+        assert first is second
+        mock_get_db.assert_called_once()
+
+    def test_db_released_on_teardown(self, app, monkeypatch):
+        """Test that a new app context resolves the database again."""
+        mock_get_db = Mock()
+        monkeypatch.setattr("src.api.app.get_db", mock_get_db)
+
+        with app.app_context():
+            app_module.get_request_db()
+        with app.app_context():
+            app_module.get_request_db()
+
+        assert mock_get_db.call_count == 2
+
+
 @pytest.mark.unit
 class TestHistoryRoute:
     """Test conversation history page route."""
@@ -408,6 +727,55 @@ class TestHistoryRoute:
         assert b"html" in response.data.lower()
 
 
+@pytest.mark.unit
+class TestWarmup:
+    """Test QA agent warmup at startup."""
+
+    def test_warmup_agent(self, monkeypatch):
+        """Test that warmup creates the agent and runs a throwaway query."""
+        mock_agent = Mock()
+        monkeypatch.setattr("src.api.app.get_agent", lambda: mock_agent)
+
+        app_module.warmup_agent()
+
+        mock_agent.warmup.assert_called_once()
+
+    def test_warmup_agent_error(self, monkeypatch, capsys):
+        """Test that a failed warmup does not stop the server from starting."""
+        def mock_get_agent_error():
+            raise RuntimeError("Failed to load collection")
+
+        monkeypatch.setattr("src.api.app.get_agent", mock_get_agent_error)
+
+        app_module.warmup_agent()
+
+        assert "Warning: QA agent warmup failed: Failed to load collection" in capsys.readouterr().out
+
+    @pytest.mark.parametrize("enabled,debug,run_main,expected", [
+        (True, False, None, 1),
+        (False, False, None, 0),
+        (True, True, None, 0),
+        (True, True, "true", 1),
+    ])
+    def test_main_warmup(self, monkeypatch, enabled, debug, run_main, expected):
+        """Test that main warms up the agent only in the serving process."""
+        mock_warmup = Mock()
+        mock_app = Mock()
+        monkeypatch.setattr(app_module, "warmup_agent", mock_warmup)
+        monkeypatch.setattr(app_module, "create_app", lambda: mock_app)
+        monkeypatch.setattr(app_module, "ENABLE_WARMUP", enabled)
+        monkeypatch.setattr(app_module, "FLASK_DEBUG", debug)
+        if run_main is None:
+            monkeypatch.delenv("WERKZEUG_RUN_MAIN", raising=False)
+        else:
+            monkeypatch.setenv("WERKZEUG_RUN_MAIN", run_main)
+
+        app_module.main()
+
+        assert mock_warmup.call_count == expected
+        mock_app.run.assert_called_once()
+
+
 @pytest.mark.integration
 class TestEndToEndConversation:
     """Test end-to-end conversation flow."""
@@ -420,7 +788,7 @@ class TestEndToEndConversation:
             json={"title": "Test Chat"},
             content_type="application/json"
         )
-        conv_id = create_response.get_json()["id"]
+        conv_id = jget(create_response)["id"]
 
         # Add user message
         client.post(
@@ -438,7 +806,7 @@ class TestEndToEndConversation:
 
         # Retrieve conversation
         get_response = client.get(f"/api/conversations/{conv_id}")
-        data = get_response.get_json()
+        data = jget(get_response)
 
         assert data["title"] == "Test Chat"
         assert len(data["messages"]) == 2
@@ -447,7 +815,7 @@ class TestEndToEndConversation:
 
         # Search for it
         search_response = client.get("/api/conversations/search?q=Chat")
-        search_data = search_response.get_json()
+        search_data = jget(search_response)
         assert len(search_data) >= 1
 
         # Delete it
@@ -1,84 +1,75 @@
 """Tests for indexing module."""
 import pytest
 from pathlib import Path
-from unittest.mock import Mock, MagicMock, patch
+from unittest.mock import DEFAULT, Mock, MagicMock, call, patch
+
+import fitz
 
 from src.indexing import build_index
+from src.indexing.embedding_cache import EmbeddingCache
 
 
 @pytest.mark.unit
 class TestInitializeSettings:
     """Test initialize_settings function."""
 
-    @patch("src.indexing.build_index.Settings")
-    @patch("src.indexing.build_index.HuggingFaceEmbedding")
-    @patch("src.indexing.build_index.Ollama")
-    def test_initialize_settings(self, mock_ollama, mock_embedding, mock_settings):
-        """Test that settings are initialized correctly."""
+    @patch("src.indexing.build_index.settings")
+    def test_initialize_settings(self, mock_settings_module):
+        """Test that the shared settings are applied with the configured model."""
         build_index.initialize_settings()
 
-        # Verify embedding model was created
-        mock_embedding.assert_called_once()
-
-        # Verify LLM was created
-        mock_ollama.assert_called_once()
-
-        # Verify settings were set
-        assert mock_settings.embed_model is not None
-        assert mock_settings.llm is not None
-        assert mock_settings.chunk_size is not None
-        assert mock_settings.chunk_overlap is not None
+        mock_settings_module.initialize_settings.assert_called_once_with(
+            mock_settings_module.create_embed_model.return_value
+        )
 
 
 @pytest.mark.unit
 class TestLoadDocuments:
     """Test load_documents function."""
 
-    @patch("src.indexing.build_index.SimpleDirectoryReader")
-    def test_load_documents_success(self, mock_reader, temp_dir):
+    @patch("src.indexing.build_index.iter_pdf_documents")
+    def test_load_documents_success(self, mock_iter_docs, temp_dir, monkeypatch):
         """Test loading documents successfully."""
-        # Create a test PDF file
+        # Discovery only needs the file to exist; the page parser is mocked
         test_pdf_dir = temp_dir / "pdfs"
         test_pdf_dir.mkdir()
         test_pdf = test_pdf_dir / "test.pdf"
-        test_pdf.write_text("fake pdf content")
+        test_pdf.touch()
 
-        # Mock the reader
-        mock_reader_instance = Mock()
+        # Mock the page parser
         mock_doc = Mock()
-        mock_reader_instance.load_data.return_value = [mock_doc]
-        mock_reader.return_value = mock_reader_instance
+        mock_iter_docs.return_value = iter([mock_doc])
 
-        # Patch DATA_DIR
-        with patch("src.indexing.build_index.DATA_DIR", test_pdf_dir):
-            documents = build_index.load_documents()
+        monkeypatch.setattr(build_index, "DATA_DIR", test_pdf_dir)
+        documents = build_index.load_documents()
 
-        assert len(documents) == 1
-        mock_reader_instance.load_data.assert_called_once()
+        assert list(documents) == [mock_doc]
+        mock_iter_docs.assert_called_once_with([test_pdf])
 
-    def test_load_documents_no_data_dir(self, temp_dir):
+    def test_load_documents_no_data_dir(self, temp_dir, monkeypatch):
         """Test loading documents when data directory doesn't exist."""
         non_existent_dir = temp_dir / "nonexistent"
 
-        with patch("src.indexing.build_index.DATA_DIR", non_existent_dir):
-            documents = build_index.load_documents()
+        monkeypatch.setattr(build_index, "DATA_DIR", non_existent_dir)
+        documents = build_index.load_documents()
 
         assert documents == []
 
-    @patch("src.indexing.build_index.SimpleDirectoryReader")
-    def test_load_documents_no_pdfs(self, mock_reader, temp_dir):
+    @patch("src.indexing.build_index.iter_pdf_documents")
+    def test_load_documents_no_pdfs(self, mock_iter_docs, temp_dir, monkeypatch):
         """Test loading documents when no PDFs exist."""
         # Create empty directory
         pdf_dir = temp_dir / "pdfs"
         pdf_dir.mkdir()
 
-        with patch("src.indexing.build_index.DATA_DIR", pdf_dir):
-            documents = build_index.load_documents()
+        monkeypatch.setattr(build_index, "DATA_DIR", pdf_dir)
+        documents = build_index.load_documents()
 
         assert documents == []
+        mock_iter_docs.assert_not_called()
 
-    @patch("src.indexing.build_index.SimpleDirectoryReader")
-    def test_load_documents_recursive(self, mock_reader, temp_dir):
+    @patch("src.indexing.build_index.iter_pdf_documents")
+    def test_load_documents_recursive(self, mock_iter_docs, temp_dir, monkeypatch):
         """Test that documents are loaded recursively."""
         # Create nested PDF structure
         pdf_dir = temp_dir / "pdfs"
@@ -86,132 +77,297 @@ class TestLoadDocuments:
         sub_dir = pdf_dir / "subdir"
         sub_dir.mkdir()
 
-        (pdf_dir / "test1.pdf").write_text("fake pdf 1")
-        (sub_dir / "test2.pdf").write_text("fake pdf 2")
+        (pdf_dir / "test1.pdf").touch()
+        (sub_dir / "test2.pdf").touch()
+        (pdf_dir / "notes.txt").touch()
+
+        monkeypatch.setattr(build_index, "DATA_DIR", pdf_dir)
+        build_index.load_documents()
+
+        # Verify PDFs in subdirectories are included
+        mock_iter_docs.assert_called_once()
+        pdf_files = mock_iter_docs.call_args[0][0]
+        assert sorted(pdf_files) == [pdf_dir / "subdir" / "test2.pdf", pdf_dir / "test1.pdf"]
+
 
-        # Mock the reader
-        mock_reader_instance = Mock()
-        mock_reader_instance.load_data.return_value = [Mock(), Mock()]
-        mock_reader.return_value = mock_reader_instance
+@pytest.mark.unit
+class TestIterPdfDocuments:
+    """Test iter_pdf_documents function."""
+
+    def _write_pdf(self, path, pages):
+        with fitz.open() as doc:
+            for text in pages:
+                page = doc.new_page()
+                page.insert_text((50, 50), text)
+            doc.save(path)
+
+    def test_yields_one_document_per_page(self, temp_dir):
+        """Test that each page becomes a Document with source metadata."""
+        pdf_path = temp_dir / "guide.pdf"
+        self._write_pdf(pdf_path, ["First page", "Second page"])
+
+        documents = list(build_index.iter_pdf_documents([pdf_path]))
+
+        assert len(documents) == 2
+        assert "First page" in documents[0].text
+        assert "Second page" in documents[1].text
+        assert documents[1].metadata == {
+            "file_name": "guide.pdf",
+            "page_label": "2",
+            "file_path": str(pdf_path),
+        }
+
+    def test_file_name_excluded_from_embedding(self, temp_dir):
+        """Test that the embedded text keeps the page label and path only."""
+        pdf_path = temp_dir / "guide.pdf"
+        self._write_pdf(pdf_path, ["Content"])
+
+        document = next(build_index.iter_pdf_documents([pdf_path]))
+
+        assert "file_name" in document.excluded_embed_metadata_keys
+        assert "file_name" in document.excluded_llm_metadata_keys
+
+    @patch("src.indexing.build_index.os.cpu_count", return_value=4)
+    @patch("src.indexing.build_index.ProcessPoolExecutor")
+    def test_parses_files_in_process_pool(self, mock_executor, mock_cpu_count, temp_dir):
+        """Test that multiple PDFs are parsed in worker processes, in order."""
+        first, second = temp_dir / "a.pdf", temp_dir / "b.pdf"
+        doc_a, doc_b, doc_c = Mock(), Mock(), Mock()
+        executor = mock_executor.return_value.__enter__.return_value
+        executor.submit.side_effect = [
+            Mock(**{"result.return_value": [doc_a, doc_b]}),
+            Mock(**{"result.return_value": [doc_c]}),
+        ]
+
+        documents = list(build_index.iter_pdf_documents([first, second]))
+
+        assert documents == [doc_a, doc_b, doc_c]
+        mock_executor.assert_called_once_with(max_workers=2)
+        assert executor.submit.call_args_list == [
+            call(build_index._parse_one_pdf, first),
+            call(build_index._parse_one_pdf, second),
+        ]
+
+    @patch("src.indexing.build_index.os.cpu_count", return_value=2)
+    @patch("src.indexing.build_index.ProcessPoolExecutor")
+    def test_bounds_files_in_flight(self, mock_executor, mock_cpu_count, temp_dir):
+        """Test that a slow consumer holds back submissions to two files per worker."""
+        paths = [temp_dir / f"{i}.pdf" for i in range(10)]
+        executor = mock_executor.return_value.__enter__.return_value
+        executor.submit.side_effect = lambda fn, path: Mock(**{"result.return_value": [path]})
+
+        documents = build_index.iter_pdf_documents(paths)
+
+        assert next(documents) == paths[0]
+        # Four files were submitted up front, and taking the first freed one slot
+        assert executor.submit.call_count == 5
+        assert list(documents) == paths[1:]
+        assert executor.submit.call_count == 10
+
+    @patch("src.indexing.build_index.ProcessPoolExecutor")
+    def test_single_file_parsed_inline(self, mock_executor, temp_dir):
+        """Test that a lone PDF skips the process pool."""
+        pdf_path = temp_dir / "guide.pdf"
+        self._write_pdf(pdf_path, ["Content"])
+
+        documents = list(build_index.iter_pdf_documents([pdf_path]))
+
+        assert len(documents) == 1
+        mock_executor.assert_not_called()
+
+    def test_is_lazy(self, temp_dir):
+        """Test that files are not opened before pages are requested."""
+        missing = temp_dir / "missing.pdf"
 
-        with patch("src.indexing.build_index.DATA_DIR", pdf_dir):
-            documents = build_index.load_documents()
+        # Creating the iterator must not touch the (missing) file
+        documents = build_index.iter_pdf_documents([missing])
 
-        # Verify recursive=True was passed
-        mock_reader.assert_called_once()
-        call_kwargs = mock_reader.call_args[1]
-        assert call_kwargs["recursive"] is True
-        assert call_kwargs["required_exts"] == [".pdf"]
+        with pytest.raises(Exception):
+            next(documents)
 
 
 @pytest.mark.unit
 class TestCreateVectorStore:
     """Test create_vector_store function."""
 
-    @patch("src.indexing.build_index.chromadb.PersistentClient")
-    @patch("src.indexing.build_index.ChromaVectorStore")
-    def test_create_vector_store(self, mock_vector_store, mock_chromadb, temp_dir):
+    @pytest.fixture
+    def chroma(self, temp_dir, monkeypatch):
+        """Patch the Chroma client and vector store, returning the mocks by name."""
+        monkeypatch.setattr(build_index, "CHROMA_DIR", temp_dir)
+        with patch.multiple(
+            "src.indexing.build_index",
+            ChromaVectorStore=DEFAULT,
+        ) as mocks, patch("src.indexing.build_index.chromadb.PersistentClient") as client:
+            mocks["PersistentClient"] = client
+            yield mocks
+
+    def test_create_vector_store(self, chroma):
         """Test creating vector store."""
-        # Mock ChromaDB client
-        mock_db = Mock()
-        mock_collection = Mock()
-        mock_db.get_or_create_collection.return_value = mock_collection
-        mock_chromadb.return_value = mock_db
+        mock_db = chroma["PersistentClient"].return_value
 
-        # Mock vector store
-        mock_vs = Mock()
-        mock_vector_store.return_value = mock_vs
+        vector_store = build_index.create_vector_store()
 
-        with patch("src.indexing.build_index.CHROMA_DIR", temp_dir):
-            vector_store = build_index.create_vector_store()
-
-        assert vector_store is not None
-        mock_chromadb.assert_called_once()
+        assert vector_store is chroma["ChromaVectorStore"].return_value
+        chroma["PersistentClient"].assert_called_once()
         mock_db.get_or_create_collection.assert_called_once()
-        mock_vector_store.assert_called_once_with(chroma_collection=mock_collection)
+        chroma["ChromaVectorStore"].assert_called_once_with(
+            chroma_collection=mock_db.get_or_create_collection.return_value
+        )
+
+    def test_create_vector_store_uses_hnsw(self, chroma):
+        """Test that the collection is created with HNSW settings."""
+        build_index.create_vector_store()
+
+        mock_db = chroma["PersistentClient"].return_value
+        metadata = mock_db.get_or_create_collection.call_args[1]["metadata"]
+        assert metadata["hnsw:space"] == "cosine"
+        assert metadata["hnsw:M"] == build_index.HNSW_M
+        assert metadata["hnsw:construction_ef"] == build_index.HNSW_EF_CONSTRUCTION
+        assert metadata["hnsw:search_ef"] == build_index.HNSW_EF_SEARCH
 
 
 @pytest.mark.unit
 class TestBuildIndex:
     """Test build_index function."""
 
+    @patch("src.indexing.build_index.INDEX_BATCH_SIZE", 2)
+    @patch("src.indexing.build_index.embed_nodes")
+    @patch("src.indexing.build_index.SentenceSplitter")
     @patch("src.indexing.build_index.VectorStoreIndex")
     @patch("src.indexing.build_index.StorageContext")
-    def test_build_index(self, mock_storage_context, mock_index):
+    def test_build_index(self, mock_storage_context, mock_index, mock_splitter, mock_embed_nodes):
         """Test building index from documents."""
         # Mock documents and vector store
-        mock_docs = [Mock(), Mock()]
+        mock_docs = [Mock(), Mock(), Mock()]
         mock_vector_store = Mock()
 
+        # Mock node parser: one list of nodes per batch of documents
+        first_nodes = [Mock(), Mock()]
+        second_nodes = [Mock()]
+        mock_splitter.return_value.get_nodes_from_documents.side_effect = [first_nodes, second_nodes]
+
         # Mock storage context
         mock_ctx = Mock()
         mock_storage_context.from_defaults.return_value = mock_ctx
 
         # Mock index
         mock_idx = Mock()
-        mock_index.from_documents.return_value = mock_idx
+        mock_index.return_value = mock_idx
 
-        result = build_index.build_index(mock_docs, mock_vector_store)
+        mock_cache = Mock()
+        result = build_index.build_index(iter(mock_docs), mock_vector_store, cache=mock_cache)
 
-        assert result is not None
+        assert result is mock_idx
         mock_storage_context.from_defaults.assert_called_once_with(vector_store=mock_vector_store)
-        mock_index.from_documents.assert_called_once()
+        mock_index.assert_called_once_with([], storage_context=mock_ctx)
+
+        # Documents are processed in batches of INDEX_BATCH_SIZE
+        split_calls = mock_splitter.return_value.get_nodes_from_documents.call_args_list
+        assert [call[0][0] for call in split_calls] == [mock_docs[:2], mock_docs[2:]]
+        assert mock_embed_nodes.call_args_list[0][0] == (first_nodes, mock_cache)
+        assert mock_embed_nodes.call_args_list[1][0] == (second_nodes, mock_cache)
+        assert [call[0][0] for call in mock_idx.insert_nodes.call_args_list] == [
+            first_nodes,
+            second_nodes,
+        ]
+
+    @patch("src.indexing.build_index.embed_nodes")
+    @patch("src.indexing.build_index.SentenceSplitter")
+    @patch("src.indexing.build_index.VectorStoreIndex")
+    @patch("src.indexing.build_index.StorageContext")
+    def test_build_index_empty(self, mock_storage_context, mock_index, mock_splitter, mock_embed_nodes):
+        """Test that an empty document stream inserts nothing."""
+        build_index.build_index(iter([]), Mock(), cache=Mock())
+
+        mock_embed_nodes.assert_not_called()
+        mock_index.return_value.insert_nodes.assert_not_called()
+
+
+@pytest.mark.unit
+class TestEmbedNodes:
+    """Test embed_nodes function."""
+
+    def _make_node(self, text):
+        node = Mock()
+        node.get_content.return_value = text
+        node.embedding = None
+        return node
+
+    @patch("src.indexing.build_index.Settings")
+    def test_embed_nodes_only_embeds_misses(self, mock_settings, temp_dir):
+        """Test that cached chunks are not sent to the embedding model."""
+        cache = EmbeddingCache("test-model", db_path=temp_dir / "embeddings.db")
+        cache.put_many({cache.hash_text("cached"): [1.0, 2.0]})
+        mock_settings.embed_model.get_text_embedding_batch.return_value = [[3.0, 4.0]]
+
+        nodes = [self._make_node("cached"), self._make_node("new")]
+        build_index.embed_nodes(nodes, cache)
+
+        call_args = mock_settings.embed_model.get_text_embedding_batch.call_args
+        assert call_args[0][0] == ["new"]
+        assert nodes[0].embedding == [1.0, 2.0]
+        assert nodes[1].embedding == [3.0, 4.0]
+
+        # New embeddings are stored for the next run
+        assert cache.get_many([cache.hash_text("new")]) == {cache.hash_text("new"): [3.0, 4.0]}
 
-        # Verify arguments to from_documents
-        call_args = mock_index.from_documents.call_args
-        assert call_args[0][0] == mock_docs
-        assert call_args[1]["storage_context"] == mock_ctx
-        assert call_args[1]["show_progress"] is True
+    @patch("src.indexing.build_index.Settings")
+    def test_embed_nodes_all_cached(self, mock_settings, temp_dir):
+        """Test that a fully cached batch skips the embedding model."""
+        cache = EmbeddingCache("test-model", db_path=temp_dir / "embeddings.db")
+        cache.put_many({cache.hash_text("cached"): [1.0, 2.0]})
+
+        nodes = [self._make_node("cached"), self._make_node("cached")]
+        build_index.embed_nodes(nodes, cache)
+
+        mock_settings.embed_model.get_text_embedding_batch.assert_not_called()
+        assert all(node.embedding == [1.0, 2.0] for node in nodes)
 
 
 @pytest.mark.unit
 class TestMain:
     """Test main function."""
 
-    @patch("src.indexing.build_index.build_index")
-    @patch("src.indexing.build_index.create_vector_store")
-    @patch("src.indexing.build_index.load_documents")
-    @patch("src.indexing.build_index.initialize_settings")
-    def test_main_success(
-        self, mock_init, mock_load_docs, mock_create_vs, mock_build_idx
-    ):
+    @pytest.fixture
+    def pipeline(self):
+        """Patch every pipeline step main() calls and return the mocks by name."""
+        with patch.multiple(
+            "src.indexing.build_index",
+            initialize_settings=DEFAULT,
+            load_documents=DEFAULT,
+            create_vector_store=DEFAULT,
+            build_index=DEFAULT,
+        ) as mocks:
+            yield mocks
+
+    def test_main_success(self, pipeline):
         """Test successful main execution."""
-        # Mock return values
         mock_docs = [Mock()]
-        mock_load_docs.return_value = mock_docs
-        mock_vs = Mock()
-        mock_create_vs.return_value = mock_vs
-        mock_idx = Mock()
-        mock_build_idx.return_value = mock_idx
+        pipeline["load_documents"].return_value = mock_docs
 
         build_index.main()
 
         # Verify all functions were called
-        mock_init.assert_called_once()
-        mock_load_docs.assert_called_once()
-        mock_create_vs.assert_called_once()
-        mock_build_idx.assert_called_once_with(mock_docs, mock_vs)
-
-    @patch("src.indexing.build_index.build_index")
-    @patch("src.indexing.build_index.create_vector_store")
-    @patch("src.indexing.build_index.load_documents")
-    @patch("src.indexing.build_index.initialize_settings")
-    def test_main_no_documents(
-        self, mock_init, mock_load_docs, mock_create_vs, mock_build_idx
-    ):
+        pipeline["initialize_settings"].assert_called_once()
+        pipeline["load_documents"].assert_called_once()
+        pipeline["create_vector_store"].assert_called_once()
+        pipeline["build_index"].assert_called_once_with(
+            mock_docs, pipeline["create_vector_store"].return_value
+        )
+
+    def test_main_no_documents(self, pipeline):
         """Test main when no documents are found."""
-        # Mock empty document list
-        mock_load_docs.return_value = []
+        pipeline["load_documents"].return_value = []
 
         build_index.main()
 
         # Verify initialization and load were called
-        mock_init.assert_called_once()
-        mock_load_docs.assert_called_once()
+        pipeline["initialize_settings"].assert_called_once()
+        pipeline["load_documents"].assert_called_once()
 
         # But vector store and build should not be called
-        mock_create_vs.assert_not_called()
-        mock_build_idx.assert_not_called()
+        pipeline["create_vector_store"].assert_not_called()
+        pipeline["build_index"].assert_not_called()
 
 
 @pytest.mark.slow
@@ -0,0 +1,58 @@
+"""Tests for the indexing embedding cache."""
+import sqlite3
+import pytest
+
+from src.indexing.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def embedding_cache(temp_dir):
+    """Create a test embedding cache."""
+    return EmbeddingCache("test-model", db_path=temp_dir / "embeddings.db")
+
+
+@pytest.mark.unit
+class TestEmbeddingCache:
+    """Test EmbeddingCache class."""
+
+    def test_init_creates_table(self, embedding_cache):
+        """Test that initialization creates the cache table."""
+        with sqlite3.connect(embedding_cache.db_path) as conn:
+            cursor = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name='embedding_cache'"
+            )
+            assert cursor.fetchone() is not None
+
+    def test_hash_text_is_stable(self):
+        """Test that equal text produces equal keys."""
+        assert EmbeddingCache.hash_text("chunk") == EmbeddingCache.hash_text("chunk")
+        assert EmbeddingCache.hash_text("chunk") != EmbeddingCache.hash_text("other chunk")
+
+    def test_put_and_get_many(self, embedding_cache):
+        """Test storing and retrieving embeddings."""
+        embedding_cache.put_many({"a": [0.5, 1.5], "b": [2.0, -1.0]})
+
+        found = embedding_cache.get_many(["a", "b", "missing"])
+
+        assert found == {"a": [0.5, 1.5], "b": [2.0, -1.0]}
+
+    def test_get_many_empty(self, embedding_cache):
+        """Test lookup with no hashes."""
+        assert embedding_cache.get_many([]) == {}
+
+    def test_get_many_large_batch(self, embedding_cache):
+        """Test lookups larger than a single IN (...) batch."""
+        embeddings = {f"key{i}": [float(i)] for i in range(1200)}
+        embedding_cache.put_many(embeddings)
+
+        found = embedding_cache.get_many(embeddings.keys())
+
+        assert found == embeddings
+
+    def test_cache_is_scoped_by_model(self, embedding_cache):
+        """Test that embeddings from another model are not returned."""
+        embedding_cache.put_many({"a": [1.0]})
+
+        other = EmbeddingCache("other-model", db_path=embedding_cache.db_path)
+
+        assert other.get_many(["a"]) == {}
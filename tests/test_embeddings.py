@@ -0,0 +1,184 @@
+"""Tests for embedding backends."""
+import asyncio
+import sys
+import pytest
+import numpy as np
+from unittest.mock import Mock, patch
+
+from src.embeddings import settings
+from src.embeddings.infinity_backend import InfinityEmbedding
+
+
+class FakeEngine:
+    """Stand-in for infinity_emb.AsyncEmbeddingEngine."""
+
+    def __init__(self):
+        self.started = False
+        self.calls = []
+
+    async def astart(self):
+        self.started = True
+
+    async def embed(self, sentences):
+        self.calls.append(list(sentences))
+        return [np.array([float(len(s)), 1.0]) for s in sentences], len(sentences)
+
+
+@pytest.fixture
+def fake_infinity():
+    """Install a fake infinity_emb module and return its engine."""
+    engine = FakeEngine()
+    module = Mock()
+    module.AsyncEmbeddingEngine.from_args.return_value = engine
+    with patch.dict(sys.modules, {"infinity_emb": module}):
+        yield module, engine
+
+
+@pytest.mark.unit
+class TestInfinityEmbedding:
+    """Test InfinityEmbedding backend."""
+
+    def test_init_starts_engine(self, fake_infinity):
+        """Test that the engine is configured and started."""
+        module, engine = fake_infinity
+
+        embed_model = InfinityEmbedding(model_name="test-model", device="cuda", embed_batch_size=16)
+
+        assert engine.started
+        module.EngineArgs.assert_called_once_with(
+            model_name_or_path="test-model",
+            engine="torch",
+            device="cuda",
+            dtype="float16",
+            batch_size=16,
+        )
+        assert embed_model.dtype == "float16"
+
+    def test_cpu_uses_float32(self, fake_infinity):
+        """Test that CPU inference keeps full precision."""
+        embed_model = InfinityEmbedding(model_name="test-model", device="cpu")
+
+        assert embed_model.dtype == "float32"
+
+    def test_text_embedding_batch(self, fake_infinity):
+        """Test that a batch of texts is embedded in one engine call."""
+        _module, engine = fake_infinity
+        embed_model = InfinityEmbedding(model_name="test-model", device="cpu")
+
+        embeddings = embed_model.get_text_embedding_batch(["a", "bcd"])
+
+        assert embeddings == [[1.0, 1.0], [3.0, 1.0]]
+        assert engine.calls == [["a", "bcd"]]
+
+    def test_query_embedding_uses_instruction(self, fake_infinity):
+        """Test that BGE queries get the same instruction as HuggingFaceEmbedding."""
+        _module, engine = fake_infinity
+        embed_model = InfinityEmbedding(model_name="BAAI/bge-small-en-v1.5", device="cpu")
+
+        embed_model.get_query_embedding("What is this?")
+
+        assert engine.calls[0][0].endswith("What is this?")
+        assert engine.calls[0][0] != "What is this?"
+
+    def test_query_embedding_batch(self, fake_infinity):
+        """Test that a batch of queries is embedded in one engine call."""
+        _module, engine = fake_infinity
+        embed_model = InfinityEmbedding(model_name="test-model", device="cpu")
+
+        embeddings = embed_model.get_query_embedding_batch(["a", "bcd"])
+
+        assert embeddings == [[1.0, 1.0], [3.0, 1.0]]
+        assert engine.calls == [["a", "bcd"]]
+
+    def test_async_query_embedding(self, fake_infinity):
+        """Test the async query path."""
+        embed_model = InfinityEmbedding(model_name="test-model", device="cpu")
+
+        embedding = asyncio.run(embed_model.aget_query_embedding("abc"))
+
+        assert embedding == [3.0, 1.0]
+
+    def test_missing_package(self):
+        """Test that a missing infinity_emb package raises a helpful error."""
+        with patch.dict(sys.modules, {"infinity_emb": None}):
+            with pytest.raises(ImportError) as exc_info:
+                InfinityEmbedding(model_name="test-model")
+
+        assert "infinity" in str(exc_info.value)
+
+
+@pytest.mark.unit
+class TestCreateEmbedModel:
+    """Test create_embed_model function."""
+
+    @patch("src.embeddings.settings.torch")
+    @patch("src.embeddings.settings.HuggingFaceEmbedding")
+    def test_cpu(self, mock_embedding, mock_torch):
+        """Test that CPU inference uses the CPU batch size and tuned torch threads."""
+        mock_torch.cuda.is_available.return_value = False
+
+        embed_model = settings.create_embed_model()
+
+        assert embed_model == mock_embedding.return_value
+        mock_embedding.assert_called_once_with(
+            model_name=settings.EMBEDDING_MODEL,
+            embed_batch_size=settings.EMBED_BATCH_SIZE,
+            device="cpu",
+            cache_folder=str(settings.EMBED_MODEL_CACHE_DIR),
+        )
+        mock_torch.set_num_threads.assert_called_once_with(settings.TORCH_NUM_THREADS)
+        assert mock_torch.backends.mkldnn.enabled is True
+
+    @patch("src.embeddings.settings.torch")
+    @patch("src.embeddings.settings.HuggingFaceEmbedding")
+    def test_cuda(self, mock_embedding, mock_torch):
+        """Test that the GPU batch size is used when CUDA is available."""
+        mock_torch.cuda.is_available.return_value = True
+
+        settings.create_embed_model()
+
+        call_kwargs = mock_embedding.call_args[1]
+        assert call_kwargs["device"] == "cuda"
+        assert call_kwargs["embed_batch_size"] == settings.EMBED_BATCH_SIZE_GPU
+        mock_torch.set_num_threads.assert_not_called()
+
+    @patch("src.embeddings.settings.EMBEDDING_BACKEND", "infinity")
+    @patch("src.embeddings.settings.torch")
+    @patch("src.embeddings.settings.InfinityEmbedding")
+    @patch("src.embeddings.settings.HuggingFaceEmbedding")
+    def test_infinity_backend(self, mock_embedding, mock_infinity, mock_torch):
+        """Test that the Infinity backend can be selected."""
+        mock_torch.cuda.is_available.return_value = True
+
+        embed_model = settings.create_embed_model()
+
+        assert embed_model == mock_infinity.return_value
+        mock_infinity.assert_called_once_with(
+            model_name=settings.EMBEDDING_MODEL,
+            embed_batch_size=settings.EMBED_BATCH_SIZE_GPU,
+            device="cuda",
+        )
+        mock_embedding.assert_not_called()
+
+
+@pytest.mark.unit
+class TestInitializeSettings:
+    """Test initialize_settings function."""
+
+    @patch("src.embeddings.settings.Settings")
+    @patch("src.embeddings.settings.Ollama")
+    def test_initialize_settings(self, mock_ollama, mock_settings):
+        """Test that settings are initialized correctly."""
+        embed_model = Mock()
+
+        settings.initialize_settings(embed_model)
+
+        mock_ollama.assert_called_once_with(
+            model=settings.OLLAMA_MODEL,
+            base_url=settings.OLLAMA_BASE_URL,
+            request_timeout=settings.OLLAMA_REQUEST_TIMEOUT,
+        )
+        assert mock_settings.embed_model == embed_model
+        assert mock_settings.llm == mock_ollama.return_value
+        assert mock_settings.chunk_size == settings.CHUNK_SIZE
+        assert mock_settings.chunk_overlap == settings.CHUNK_OVERLAP
@@ -1,9 +1,11 @@
 """Tests for database models."""
 import pytest
+import re
 import sqlite3
-from datetime import datetime
+from unittest.mock import Mock, patch
 
-from src.models import ConversationDB, get_db
+import src.models
+from src.models import ConversationDB, get_db, next_cursor
 
 
 @pytest.mark.unit
@@ -14,51 +16,199 @@ class TestConversationDB:
         """Test that database is created on initialization."""
         db = ConversationDB(db_path=test_db_path)
         assert test_db_path.exists()
+        db.close()
 
-    def test_init_creates_tables(self, conversation_db, test_db_path):
-        """Test that required tables are created."""
-        with sqlite3.connect(test_db_path) as conn:
-            cursor = conn.cursor()
+    def test_init_runs_once_per_path(self, test_db_path):
+        """Test that reopening an initialized database skips the schema sync."""
+        with patch.object(ConversationDB, "_init_db", autospec=True,
+                          side_effect=ConversationDB._init_db) as mock_init:
+            ConversationDB(db_path=test_db_path).close()
+            ConversationDB(db_path=test_db_path).close()
 
-            # Check conversations table exists
-            cursor.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='conversations'"
-            )
-            assert cursor.fetchone() is not None
+        assert mock_init.call_count == 1
 
-            # Check messages table exists
-            cursor.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='messages'"
-            )
-            assert cursor.fetchone() is not None
+    def test_init_reruns_for_recreated_file(self, test_db_path):
+        """Test that a deleted database file gets its schema again."""
+        ConversationDB(db_path=test_db_path).close()
+        test_db_path.unlink()
 
-    def test_init_creates_indexes(self, conversation_db, test_db_path):
-        """Test that indexes are created."""
-        with sqlite3.connect(test_db_path) as conn:
-            cursor = conn.cursor()
+        db = ConversationDB(db_path=test_db_path)
+        assert db.list_conversations() == []
+        db.close()
+
+    def test_init_always_runs_for_memory_database(self):
+        """Test that in-memory databases are never treated as initialized."""
+        for _ in range(2):
+            db = ConversationDB(db_path=":memory:")
+            assert db.list_conversations() == []
+            db.close()
+
+    def test_init_creates_schema(self, conversation_db):
+        """Test that the required tables and indexes are created."""
+        rows = conversation_db._fetchall("SELECT type, name FROM sqlite_master")
+        assert {
+            ("table", "conversations"),
+            ("table", "messages"),
+            ("table", "messages_fts"),
+            ("table", "conversations_fts"),
+            ("index", "idx_conversations_updated"),
+            ("index", "idx_messages_conversation"),
+            ("index", "idx_conversations_title"),
+        } <= {tuple(row) for row in rows}
+
+    def test_title_prefix_uses_index(self, conversation_db):
+        """Test that a title prefix LIKE is a range seek on the NOCASE title index."""
+        with conversation_db._transaction() as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM conversations WHERE title LIKE ?",
+                ("abc%",)
+            ).fetchall()
+        assert "idx_conversations_title" in plan[0][3]
+        assert "SCAN" not in plan[0][3]
+
+    def test_messages_read_in_index_order(self, conversation_db):
+        """Test that a conversation's messages come back in id order without a sort step."""
+        plan = conversation_db._conn.execute(
+            "EXPLAIN QUERY PLAN "
+            "SELECT role, content, created_at FROM messages WHERE conversation_id = ? ORDER BY id ASC",
+            (1,)
+        ).fetchall()
+        details = " ".join(row["detail"] for row in plan)
+
+        assert "idx_messages_conversation" in details
+        assert "TEMP B-TREE" not in details
+
+    def test_connection_pragmas(self, test_db_path):
+        """Test that the connection runs in WAL mode with tuned settings."""
+        db = ConversationDB(db_path=test_db_path)
+        conn = db._conn
 
-            # Check for indexes
-            cursor.execute(
-                "SELECT name FROM sqlite_master WHERE type='index' AND name='idx_conversations_updated'"
-            )
-            assert cursor.fetchone() is not None
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        db.close()
+
+    def test_connection_is_reused(self, conversation_db):
+        """Test that all operations share one long-lived connection."""
+        conn = conversation_db._conn
+
+        conv_id = conversation_db.create_conversation("Test")
+        conversation_db.add_message(conv_id, "user", "Hello")
+        conversation_db.get_conversation(conv_id)
+
+        assert conversation_db._conn is conn
+
+    def test_concurrent_writes(self, conversation_db):
+        """Test that threads can share the connection safely."""
+        import threading
+
+        conv_id = conversation_db.create_conversation("Test")
+
+        def add_messages():
+            for i in range(20):
+                conversation_db.add_message(conv_id, "user", f"Message {i}")
+
+        threads = [threading.Thread(target=add_messages) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(conversation_db.get_conversation(conv_id)["messages"]) == 160
 
-            cursor.execute(
-                "SELECT name FROM sqlite_master WHERE type='index' AND name='idx_messages_conversation'"
+    def test_transaction_rolls_back_on_error(self, conversation_db):
+        """Test that a failed transaction leaves no partial writes."""
+        conv_id = conversation_db.create_conversation("Test")
+
+        with pytest.raises(sqlite3.IntegrityError):
+            with conversation_db._transaction() as conn:
+                conn.execute(
+                    "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
+                    (conv_id, "user", "kept?")
+                )
+                conn.execute("INSERT INTO messages (conversation_id) VALUES (?)", (conv_id,))
+
+        assert conversation_db.get_conversation(conv_id)["messages"] == []
+
+    def test_init_analyzes_database(self, conversation_db):
+        """Test that planner statistics exist after initialization."""
+        row = conversation_db._conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone()
+        assert row is not None
+
+    def test_close_optimizes_and_unregisters(self, test_db_path):
+        """Test that close runs PRAGMA optimize and drops its atexit hook."""
+        with patch("src.models.atexit") as mock_atexit:
+            db = ConversationDB(db_path=test_db_path)
+            mock_atexit.register.assert_called_once_with(db.close)
+
+            statements = []
+            db._conn.set_trace_callback(statements.append)
+            db.close()
+
+        assert "PRAGMA optimize" in statements
+        mock_atexit.unregister.assert_called_once_with(db.close)
+
+    def test_nested_transaction_rolls_back_inner_block(self, conversation_db):
+        """Test that a nested transaction is a savepoint within the outer one."""
+        conv_id = conversation_db.create_conversation("Test")
+
+        with conversation_db._transaction() as conn:
+            conn.execute(
+                "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
+                (conv_id, "user", "outer")
             )
-            assert cursor.fetchone() is not None
+            with pytest.raises(sqlite3.IntegrityError):
+                with conversation_db._transaction() as inner:
+                    inner.execute(
+                        "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
+                        (conv_id, "user", "inner")
+                    )
+                    inner.execute("INSERT INTO messages (conversation_id) VALUES (?)", (conv_id,))
+
+        messages = conversation_db.get_conversation(conv_id)["messages"]
+        assert [m["content"] for m in messages] == ["outer"]
+
+    def test_close(self, test_db_path):
+        """Test that closing the database closes its connection."""
+        db = ConversationDB(db_path=test_db_path)
+        db.close()
 
-    def test_create_conversation(self, conversation_db):
-        """Test creating a new conversation."""
-        conv_id = conversation_db.create_conversation("Test Title")
-        assert isinstance(conv_id, int)
-        assert conv_id > 0
+        with pytest.raises(sqlite3.ProgrammingError):
+            db.list_conversations()
+
+    def test_close_twice(self, test_db_path):
+        """Test that a second close is a no-op and later messages fail instead of hanging."""
+        db = ConversationDB(db_path=test_db_path)
+        conv_id = db.create_conversation("Test")
+        db.add_message(conv_id, "user", "Hello")
+        db.close()
+        db.close()
+
+        assert db._writer is None
+        with pytest.raises(sqlite3.ProgrammingError):
+            db.add_message(conv_id, "user", "Too late")
+        db.flush()
+
+    def test_bulk_create_conversations(self, conversation_db):
+        """Test that bulk_create_conversations returns IDs in title order."""
+        ids = conversation_db.bulk_create_conversations(["A", "B", "C"])
+
+        assert len(set(ids)) == 3
+        assert [conversation_db.get_conversation(i)["title"] for i in ids] == ["A", "B", "C"]
 
     def test_create_conversation_with_default_title(self, conversation_db):
         """Test creating a conversation with default title."""
         conv_id = conversation_db.create_conversation()
+        assert isinstance(conv_id, int)
+        assert conv_id > 0
+
         conv = conversation_db.get_conversation(conv_id)
         assert conv["title"] == "New Conversation"
+        assert conv["created_at"] == conv["updated_at"]
 
     def test_update_conversation_title(self, conversation_db):
         """Test updating a conversation's title."""
@@ -68,16 +218,6 @@ class TestConversationDB:
         conv = conversation_db.get_conversation(conv_id)
         assert conv["title"] == "Updated Title"
 
-    def test_add_message(self, conversation_db):
-        """Test adding a message to a conversation."""
-        conv_id = conversation_db.create_conversation("Test")
-        conversation_db.add_message(conv_id, "user", "Hello")
-
-        conv = conversation_db.get_conversation(conv_id)
-        assert len(conv["messages"]) == 1
-        assert conv["messages"][0]["role"] == "user"
-        assert conv["messages"][0]["content"] == "Hello"
-
     def test_add_multiple_messages(self, conversation_db):
         """Test adding multiple messages to a conversation."""
         conv_id = conversation_db.create_conversation("Test")
@@ -86,10 +226,30 @@ class TestConversationDB:
         conversation_db.add_message(conv_id, "user", "How are you?")
 
         conv = conversation_db.get_conversation(conv_id)
-        assert len(conv["messages"]) == 3
-        assert conv["messages"][0]["role"] == "user"
-        assert conv["messages"][1]["role"] == "assistant"
-        assert conv["messages"][2]["role"] == "user"
+        assert [(m["role"], m["content"]) for m in conv["messages"]] == [
+            ("user", "Hello"), ("assistant", "Hi there!"), ("user", "How are you?")
+        ]
+
+    def test_add_message_touches_conversation(self, conversation_db):
+        """Test that inserting a message updates its conversation's timestamp."""
+        conv_id = conversation_db.create_conversation("Test", _now="2000-01-01T00:00:00.000Z")
+
+        conversation_db.add_message(conv_id, "user", "Hello", _now="2024-05-01T12:30:45.123Z")
+
+        conv = conversation_db.get_conversation(conv_id)
+        assert conv["updated_at"] == "2024-05-01T12:30:45.123Z"
+
+    def test_message_count_maintained(self, conversation_db):
+        """Test that message_count follows inserts and deletes."""
+        conv_id = conversation_db.create_conversation("Test")
+        conversation_db.add_messages(conv_id, [("user", f"Message {i}") for i in range(3)])
+
+        assert conversation_db.list_conversations()[0]["message_count"] == 3
+
+        with conversation_db._transaction() as conn:
+            conn.execute("DELETE FROM messages WHERE content = 'Message 0'")
+
+        assert conversation_db.list_conversations()[0]["message_count"] == 2
 
     def test_get_conversation(self, conversation_db):
         """Test getting a conversation by ID."""
@@ -101,67 +261,187 @@ class TestConversationDB:
         assert conv is not None
         assert conv["id"] == conv_id
         assert conv["title"] == "Test Conversation"
-        assert "created_at" in conv
-        assert "updated_at" in conv
+        # ISO-8601 in UTC
+        assert conv["created_at"].endswith("Z")
+        assert conv["updated_at"].endswith("Z")
         assert len(conv["messages"]) == 1
 
-    def test_get_nonexistent_conversation(self, conversation_db):
-        """Test getting a conversation that doesn't exist."""
-        conv = conversation_db.get_conversation(99999)
-        assert conv is None
+    def test_add_message_is_queued_until_flush(self, conversation_db):
+        """Test that add_message only enqueues and flush writes the batch."""
+        conv_id = conversation_db.create_conversation("Test")
+        for i in range(3):
+            conversation_db.add_message(conv_id, "user", f"Message {i}")
 
-    def test_list_conversations(self, conversation_db):
-        """Test listing conversations."""
-        # Create multiple conversations
-        id1 = conversation_db.create_conversation("First")
-        import time
-        time.sleep(0.01)  # Small delay to ensure different timestamps
-        id2 = conversation_db.create_conversation("Second")
-        time.sleep(0.01)
-        id3 = conversation_db.create_conversation("Third")
-
-        convs = conversation_db.list_conversations()
-
-        assert len(convs) == 3
-        # Should be ordered by updated_at DESC, so newest first
-        conv_ids = [conv["id"] for conv in convs]
-        assert id3 in conv_ids
-        assert id2 in conv_ids
-        assert id1 in conv_ids
-
-    def test_list_conversations_with_limit(self, conversation_db):
-        """Test listing conversations with limit."""
-        for i in range(5):
-            conversation_db.create_conversation(f"Conv {i}")
-
-        convs = conversation_db.list_conversations(limit=3)
-        assert len(convs) == 3
-
-    def test_list_conversations_with_offset(self, conversation_db):
-        """Test listing conversations with offset."""
-        for i in range(5):
-            conversation_db.create_conversation(f"Conv {i}")
-
-        convs = conversation_db.list_conversations(limit=2, offset=2)
-        assert len(convs) == 2
-
-    def test_list_conversations_includes_message_count(self, conversation_db):
-        """Test that list_conversations includes message count."""
+        conversation_db.flush()
+
+        with conversation_db._transaction() as conn:
+            count = conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conv_id,)
+            ).fetchone()[0]
+        assert count == 3
+
+    def test_add_message_to_missing_conversation_raises(self, conversation_db):
+        """Test that a message for an unknown conversation fails before it is queued."""
+        with pytest.raises(sqlite3.IntegrityError):
+            conversation_db.add_message(99999, "user", "Orphan")
+
+        assert conversation_db._write_queue.unfinished_tasks == 0
+
+    def test_add_message_non_string_raises(self, conversation_db):
+        """Test that a message with a non-string field fails before it is queued."""
         conv_id = conversation_db.create_conversation("Test")
-        conversation_db.add_message(conv_id, "user", "Message 1")
-        conversation_db.add_message(conv_id, "assistant", "Message 2")
 
-        convs = conversation_db.list_conversations()
-        assert convs[0]["message_count"] == 2
+        with pytest.raises(TypeError):
+            conversation_db.add_message(conv_id, "user", None)
 
-    def test_search_conversations_by_title(self, conversation_db):
-        """Test searching conversations by title."""
-        conversation_db.create_conversation("Python Tutorial")
-        conversation_db.create_conversation("JavaScript Guide")
-        conversation_db.create_conversation("Python Advanced")
+        assert conversation_db._write_queue.unfinished_tasks == 0
 
-        results = conversation_db.search_conversations("Python")
-        assert len(results) == 2
+    def test_write_batch_drops_only_failing_rows(self, conversation_db, capsys):
+        """Test that a row failing its foreign key in a batch does not lose the others."""
+        conv_id = conversation_db.create_conversation("Test")
+        now = "2024-01-01T00:00:00.000Z"
+
+        # e.g. a conversation deleted after its message was queued
+        conversation_db._write_messages([
+            (99999, "user", "Orphan", now),
+            (conv_id, "user", "Kept", now),
+        ])
+
+        conv = conversation_db.get_conversation(conv_id)
+        assert [m["content"] for m in conv["messages"]] == ["Kept"]
+        assert "dropped message for conversation 99999" in capsys.readouterr().out
+
+    def test_writer_survives_exception(self, conversation_db, capsys):
+        """Test that an unexpected writer error drops its batch but keeps the writer running."""
+        conv_id = conversation_db.create_conversation("Test")
+        write_messages = conversation_db._write_messages
+        failures = [RuntimeError("boom")]
+
+        def flaky(rows):
+            if failures:
+                raise failures.pop()
+            write_messages(rows)
+
+        with patch.object(conversation_db, "_write_messages", side_effect=flaky):
+            conversation_db.add_message(conv_id, "user", "Lost")
+            conversation_db.flush()
+            conversation_db.add_message(conv_id, "user", "Written")
+            conversation_db.flush()
+
+        conv = conversation_db.get_conversation(conv_id)
+        assert [m["content"] for m in conv["messages"]] == ["Written"]
+        assert "dropped 1 queued messages: boom" in capsys.readouterr().out
+
+    def test_close_writes_queued_messages(self, test_db_path):
+        """Test that closing the database writes queued messages first."""
+        db = ConversationDB(db_path=test_db_path)
+        conv_id = db.create_conversation("Test")
+        db.add_message(conv_id, "user", "Last words")
+        db.close()
+
+        with sqlite3.connect(test_db_path) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        assert count == 1
+
+    def test_add_messages(self, conversation_db):
+        """Test adding several messages at once."""
+        conv_id = conversation_db.create_conversation("Imported")
+
+        conversation_db.add_messages(conv_id, [("user", "Hi"), ("assistant", "Hello"), ("user", "Bye")])
+
+        conv = conversation_db.get_conversation(conv_id)
+        assert [(m["role"], m["content"]) for m in conv["messages"]] == [
+            ("user", "Hi"), ("assistant", "Hello"), ("user", "Bye")
+        ]
+        assert conversation_db.list_conversations()[0]["message_count"] == 3
+
+    def test_add_messages_is_atomic(self, conversation_db):
+        """Test that a bad message rolls back the whole batch."""
+        conv_id = conversation_db.create_conversation("Imported")
+
+        with pytest.raises(sqlite3.IntegrityError):
+            conversation_db.add_messages(conv_id, [("user", "Hi"), ("assistant", None)])
+
+        assert conversation_db.get_conversation(conv_id)["messages"] == []
+
+    def test_get_conversation_messages(self, conversation_db):
+        """Test that messages keep their order and exact content."""
+        conv_id = conversation_db.create_conversation("Test")
+        contents = [f"Message {i}" for i in range(20)]
+        contents.append('Quotes "here", a backslash \\ and\nnew lines, caf\u00e9 \u2713')
+        for i, content in enumerate(contents):
+            conversation_db.add_message(conv_id, "user" if i % 2 == 0 else "assistant", content)
+
+        messages = conversation_db.get_conversation(conv_id)["messages"]
+
+        assert [m["content"] for m in messages] == contents
+        assert messages[1]["role"] == "assistant"
+        assert messages[0]["created_at"].endswith("Z")
+
+    def test_get_conversation_without_messages(self, conversation_db):
+        """Test that an empty conversation has an empty message list."""
+        conv_id = conversation_db.create_conversation("Empty")
+
+        assert conversation_db.get_conversation(conv_id)["messages"] == []
+
+    def test_get_nonexistent_conversation(self, conversation_db):
+        """Test getting a conversation that doesn't exist."""
+        conv = conversation_db.get_conversation(99999)
+        assert conv is None
+
+    def test_list_conversations_returns_rows(self, conversation_db):
+        """Test that listings return sqlite3.Row objects with mapping access."""
+        conversation_db.create_conversation("First")
+
+        row = conversation_db.list_conversations()[0]
+
+        assert isinstance(row, sqlite3.Row)
+        assert dict(row)["title"] == row["title"] == "First"
+
+    def test_list_conversations_with_cursor(self, conversation_db):
+        """Test keyset pagination, including rows that share updated_at."""
+        ids = conversation_db.bulk_create_conversations(f"Conv {i}" for i in range(5))
+        with conversation_db._transaction() as conn:
+            conn.execute("UPDATE conversations SET updated_at = '2024-01-01T00:00:00.000Z'")
+
+        pages = []
+        cursor = None
+        while True:
+            page = conversation_db.list_conversations(limit=2, cursor=cursor)
+            pages.append([row["id"] for row in page])
+            cursor = next_cursor(page, 2)
+            if cursor is None:
+                break
+
+        assert pages == [ids[:2:-1], ids[2:0:-1], ids[:1]]
+
+    def test_next_cursor_empty_page(self):
+        """Test that an empty page has no next cursor, whatever the limit."""
+        assert next_cursor([], 0) is None
+        assert next_cursor([], -1) is None
+
+    def test_list_conversations_uses_index(self, conversation_db):
+        """Test that the first page reads idx_conversations_updated in order without a sort."""
+        plan = conversation_db._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM conversations "
+            "ORDER BY updated_at DESC, id DESC LIMIT 10"
+        ).fetchall()
+        details = " ".join(row["detail"] for row in plan)
+
+        assert "idx_conversations_updated" in details
+        assert "TEMP B-TREE" not in details
+
+    def test_list_conversations_uses_keyset_index(self, conversation_db):
+        """Test that a cursor page is a seek on the (updated_at, id) index."""
+        plan = conversation_db._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM conversations "
+            "WHERE (updated_at, id) < (?, ?) ORDER BY updated_at DESC, id DESC LIMIT 2",
+            ("2024-01-01T00:00:00.000Z", 1)
+        ).fetchall()
+        details = " ".join(row["detail"] for row in plan)
+
+        assert "SEARCH" in details and "idx_conversations_updated" in details
+        assert "TEMP B-TREE" not in details
 
     def test_search_conversations_by_message_content(self, conversation_db):
         """Test searching conversations by message content."""
@@ -182,13 +462,126 @@ class TestConversationDB:
         results = conversation_db.search_conversations("python")
         assert len(results) == 1
 
-    def test_search_conversations_with_limit(self, conversation_db):
-        """Test searching conversations with limit."""
-        for i in range(5):
-            conversation_db.create_conversation(f"Python {i}")
+    def test_search_conversations_prefix_and_stem(self, conversation_db):
+        """Test that message search matches word prefixes and stems."""
+        conv_id = conversation_db.create_conversation("Test")
+        conversation_db.add_message(conv_id, "user", "Recommend some tutorials")
+
+        assert [r["id"] for r in conversation_db.search_conversations("tutorial")] == [conv_id]
+        assert [r["id"] for r in conversation_db.search_conversations("recomm")] == [conv_id]
+
+    def test_search_conversations_ranked_by_relevance(self, conversation_db):
+        """Test that message matches are ordered by bm25 relevance."""
+        weak = conversation_db.create_conversation("Weak")
+        strong = conversation_db.create_conversation("Strong")
+        conversation_db.add_message(weak, "user", "python and many other unrelated words here")
+        conversation_db.add_message(strong, "user", "python python")
+
+        results = conversation_db.search_conversations("python")
+        assert [r["id"] for r in results] == [strong, weak]
+
+    def test_search_conversations_escapes_query(self, conversation_db):
+        """Test that FTS syntax in the query is treated as plain text."""
+        conv_id = conversation_db.create_conversation("Test")
+        conversation_db.add_message(conv_id, "user", 'say "hello" OR NOT world')
+
+        results = conversation_db.search_conversations('"hello" OR')
+        assert [r["id"] for r in results] == [conv_id]
+        assert conversation_db.search_conversations('NEAR(') == []
+
+    def test_search_conversations_exact_mode(self, conversation_db):
+        """Test that exact mode matches whole titles, ignoring case."""
+        conv_id = conversation_db.create_conversation("Python Basics")
+        conversation_db.create_conversation("Python Basics 2")
+
+        results = conversation_db.search_conversations("python basics", mode="exact")
+        assert [r["id"] for r in results] == [conv_id]
+
+    def test_search_conversations_prefix_mode(self, conversation_db):
+        """Test that prefix mode matches title starts and escapes wildcards."""
+        conv_a = conversation_db.create_conversation("100% coverage")
+        conversation_db.create_conversation("100 tips")
+        conversation_db.create_conversation("About 100% coverage")
+
+        results = conversation_db.search_conversations("100%", mode="prefix")
+        assert [r["id"] for r in results] == [conv_a]
+
+    def test_search_conversations_invalid_mode(self, conversation_db):
+        """Test that an unknown mode is rejected."""
+        with pytest.raises(ValueError):
+            conversation_db.search_conversations("x", mode="fuzzy")
 
-        results = conversation_db.search_conversations("Python", limit=3)
-        assert len(results) == 3
+    def test_search_ignores_diacritics(self, conversation_db):
+        """Test that accented and unaccented spellings match each other."""
+        conv_id = conversation_db.create_conversation("Café notes")
+        conversation_db.add_message(conv_id, "user", "Résumé tips")
+
+        assert [r["id"] for r in conversation_db.search_conversations("cafe")] == [conv_id]
+        assert [r["id"] for r in conversation_db.search_conversations("resume")] == [conv_id]
+
+    def test_search_title_follows_rename(self, conversation_db):
+        """Test that renamed conversations are found by their new title only."""
+        conv_id = conversation_db.create_conversation("Old name")
+
+        conversation_db.update_conversation_title(conv_id, "Quarterly report")
+
+        assert conversation_db.search_conversations("old") == []
+        assert [r["id"] for r in conversation_db.search_conversations("quarterly")] == [conv_id]
+
+    def test_search_title_and_content_listed_once(self, conversation_db):
+        """Test that a conversation matching on title and content appears once."""
+        conv_id = conversation_db.create_conversation("Python")
+        conversation_db.add_message(conv_id, "user", "More python")
+
+        assert [r["id"] for r in conversation_db.search_conversations("python")] == [conv_id]
+
+    def test_search_index_follows_deletes(self, conversation_db):
+        """Test that deleted messages are removed from the full-text index."""
+        conv_id = conversation_db.create_conversation("Test")
+        conversation_db.add_message(conv_id, "user", "ephemeral content")
+
+        conversation_db.delete_conversation(conv_id)
+
+        with conversation_db._transaction() as conn:
+            count = conn.execute(
+                "SELECT COUNT(*) FROM messages_fts WHERE messages_fts MATCH 'ephemeral'"
+            ).fetchone()[0]
+        assert count == 0
+
+    def test_migrations_index_existing_messages(self, test_db_path):
+        """Test that upgrading an existing database indexes its messages."""
+        with sqlite3.connect(test_db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE TABLE messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                INSERT INTO conversations (title, created_at, updated_at)
+                VALUES ('Old', '2024-01-02 03:04:05', '2024-01-02 03:04:05');
+                INSERT INTO messages (conversation_id, role, content, created_at)
+                VALUES (1, 'user', 'legacy text', '2024-01-02 03:04:05');
+            """)
+
+        db = ConversationDB(db_path=test_db_path)
+
+        with sqlite3.connect(test_db_path) as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == len(src.models.MIGRATIONS)
+        assert [r["id"] for r in db.search_conversations("legacy")] == [1]
+        assert db.list_conversations()[0]["message_count"] == 1
+
+        conv = db.get_conversation(1)
+        assert conv["created_at"] == "2024-01-02T03:04:05.000Z"
+        assert conv["messages"][0]["created_at"] == "2024-01-02T03:04:05.000Z"
+        db.close()
 
     def test_delete_conversation(self, conversation_db):
         """Test deleting a conversation."""
@@ -201,63 +594,123 @@ class TestConversationDB:
         conv = conversation_db.get_conversation(conv_id)
         assert conv is None
 
-    def test_delete_conversation_cascades_messages(self, conversation_db, test_db_path):
+    def test_delete_conversation_cascades_messages(self, conversation_db):
         """Test that deleting a conversation also deletes its messages."""
         conv_id = conversation_db.create_conversation("Test")
-        conversation_db.add_message(conv_id, "user", "Message 1")
-        conversation_db.add_message(conv_id, "assistant", "Message 2")
+        conversation_db.add_messages(conv_id, [("user", "Message 1"), ("assistant", "Message 2")])
 
         conversation_db.delete_conversation(conv_id)
 
         # Check that messages are also deleted
-        with sqlite3.connect(test_db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conv_id,))
-            count = cursor.fetchone()[0]
-            assert count == 0
+        rows = conversation_db._fetchall(
+            "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conv_id,)
+        )
+        assert rows[0][0] == 0
 
     def test_get_recent_conversations(self, conversation_db):
         """Test getting recent conversations."""
-        for i in range(15):
-            conversation_db.create_conversation(f"Conv {i}")
+        conversation_db.bulk_create_conversations(f"Conv {i}" for i in range(15))
 
         recent = conversation_db.get_recent_conversations(limit=10)
         assert len(recent) == 10
 
-    def test_timestamps_are_iso_format(self, conversation_db):
-        """Test that timestamps are in ISO format."""
+    def test_timestamps_stored_in_wire_format(self, conversation_db):
+        """Test that stored timestamps are already ISO-8601 with milliseconds."""
         conv_id = conversation_db.create_conversation("Test")
-        conv = conversation_db.get_conversation(conv_id)
+        conversation_db.add_message(conv_id, "user", "Hello")
+        conversation_db.flush()
 
-        # Check that timestamps end with 'Z' (ISO format with UTC)
-        assert conv["created_at"].endswith("Z")
-        assert conv["updated_at"].endswith("Z")
+        pattern = r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z"
+        with conversation_db._transaction() as conn:
+            row = conn.execute(
+                "SELECT c.created_at, c.updated_at, m.created_at "
+                "FROM conversations c JOIN messages m ON m.conversation_id = c.id"
+            ).fetchone()
+        assert all(re.fullmatch(pattern, value) for value in row)
 
     def test_updated_at_changes_on_message_add(self, conversation_db):
         """Test that updated_at changes when a message is added."""
-        conv_id = conversation_db.create_conversation("Test")
-        conv1 = conversation_db.get_conversation(conv_id)
-        original_updated = conv1["updated_at"]
+        conv_id = conversation_db.create_conversation("Test", _now="2024-01-01T00:00:00.001Z")
 
         # Add a message
-        import time
-        time.sleep(0.1)  # Small delay to ensure timestamp difference
-        conversation_db.add_message(conv_id, "user", "New message")
+        conversation_db.add_message(conv_id, "user", "New message", _now="2024-01-01T00:00:00.002Z")
+
+        conv = conversation_db.get_conversation(conv_id)
+        assert conv["created_at"] == "2024-01-01T00:00:00.001Z"
+        assert conv["updated_at"] == "2024-01-01T00:00:00.002Z"
+
+    def test_updated_at_does_not_move_back_for_older_message(self, conversation_db):
+        """Test that a message stamped before the last update leaves updated_at alone."""
+        conv_id = conversation_db.create_conversation("Test", _now="2024-01-01T00:00:00.002Z")
 
-        conv2 = conversation_db.get_conversation(conv_id)
-        new_updated = conv2["updated_at"]
+        conversation_db.add_message(conv_id, "user", "Late message", _now="2024-01-01T00:00:00.001Z")
 
-        assert new_updated >= original_updated
+        assert conversation_db.get_conversation(conv_id)["updated_at"] == "2024-01-01T00:00:00.002Z"
+
+
+# Conversations seeded for TestConversationListing, oldest first
+_LISTING_CORPUS = [
+    ("Python Tutorial", [("user", "How do lists work?"), ("assistant", "Lists are mutable.")]),
+    ("JavaScript Guide", [("user", "What is a closure?")]),
+    ("Python Advanced", []),
+    ("Python 3", []),
+    ("Python 4", []),
+]
+
+
+@pytest.fixture(scope="class")
+def seeded_db(session_db):
+    """Seed _LISTING_CORPUS once for the class, inside a savepoint undone afterwards."""
+    with session_db._lock:
+        session_db._conn.execute("SAVEPOINT seeded")
+    for i, (title, messages) in enumerate(_LISTING_CORPUS, 1):
+        now = f"2024-01-01T00:00:00.00{i}Z"
+        conv_id = session_db.create_conversation(title, _now=now)
+        session_db.add_messages(conv_id, messages, _now=now)
+    yield session_db
+    with session_db._lock:
+        session_db._conn.execute("ROLLBACK TO seeded")
+        session_db._conn.execute("RELEASE seeded")
 
 
 @pytest.mark.unit
-def test_get_db_singleton():
-    """Test that get_db returns a singleton instance."""
-    # Reset global instance
-    import src.models
-    src.models._db_instance = None
+class TestConversationListing:
+    """Test listing and searching against one seeded set of conversations."""
+
+    @pytest.mark.parametrize("limit, expected", [
+        (50, ["Python 4", "Python 3", "Python Advanced", "JavaScript Guide", "Python Tutorial"]),
+        (3, ["Python 4", "Python 3", "Python Advanced"]),
+    ])
+    def test_list_conversations(self, seeded_db, limit, expected):
+        """Test that listings are newest first and respect the limit."""
+        convs = seeded_db.list_conversations(limit=limit)
+        assert [conv["title"] for conv in convs] == expected
+
+    def test_list_conversations_includes_message_count(self, seeded_db):
+        """Test that list_conversations includes message count."""
+        counts = {conv["title"]: conv["message_count"] for conv in seeded_db.list_conversations()}
+        assert counts == {title: len(messages) for title, messages in _LISTING_CORPUS}
+
+    @pytest.mark.parametrize("query, limit, expected_count", [
+        ("Python", 50, 4),
+        ("Python", 3, 3),
+        ("JavaScript", 50, 1),
+        ("closure", 50, 1),
+        ("CLOSURES", 50, 1),
+    ])
+    def test_search_conversations(self, seeded_db, query, limit, expected_count):
+        """Test searching titles and messages, with and without a limit."""
+        results = seeded_db.search_conversations(query, limit=limit)
+        assert len(results) == expected_count
+
 
-    db1 = get_db()
-    db2 = get_db()
+@pytest.mark.unit
+def test_get_db_singleton(monkeypatch):
+    """Test that get_db returns a singleton instance."""
+    # Only identity matters, so no database is opened
+    factory = Mock()
+    monkeypatch.setattr(src.models, "ConversationDB", factory)
+    monkeypatch.setattr(src.models, "_db_instance", None)
 
-    assert db1 is db2
+    assert get_db() is get_db() is factory.return_value
+    factory.assert_called_once_with()